@@ -0,0 +1,123 @@
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows, memory limit is skipped there
+    resource = None
+
+from engine import calculate
+
+DEFAULT_TIMEOUT = 5.0  # seconds
+DEFAULT_MEMORY_LIMIT = 1024 * 1024 * 1024  # bytes of address space for the worker
+POLL_INTERVAL = 10  # milliseconds between checks for a finished evaluation
+
+
+def limit_memory(memory_limit):
+    if resource is not None and memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def serve(connection, memory_limit):
+    limit_memory(memory_limit)
+
+    while True:
+        try:
+            function, expression = connection.recv()
+        except EOFError:
+            return
+        try:
+            connection.send((True, function(expression)))
+        except MemoryError:
+            connection.send((False, "Out of memory"))
+        except Exception as exc:
+            connection.send((False, f"{type(exc).__name__}: {exc}"))
+
+
+class BackgroundEvaluator:
+    # Runs calculations in a separate worker process so an expensive expression
+    # never blocks the Tk mainloop. The widget's after() is used to poll for the
+    # result, so callbacks always run on the Tk thread. A worker that runs past
+    # its deadline or is cancelled is killed and replaced on the next submit.
+
+    def __init__(self, widget, timeout=DEFAULT_TIMEOUT, memory_limit=DEFAULT_MEMORY_LIMIT):
+        self.widget = widget
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.context = None
+        self.process = None
+        self.connection = None
+        self.job = None
+        self.deadline = None
+        self.on_result = None
+        self.on_error = None
+
+    @property
+    def busy(self):
+        return self.job is not None
+
+    def start(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        if self.context is None:
+            import multiprocessing
+            self.context = multiprocessing.get_context("spawn")
+        self.connection, child_connection = self.context.Pipe()
+        self.process = self.context.Process(
+            target=serve,
+            args=(child_connection, self.memory_limit),
+            daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+
+    def submit(self, expression, on_result, on_error, function=calculate):
+        # function must be a module-level function so it can be sent to the worker
+        self.cancel()
+        self.start()
+        self.on_result = on_result
+        self.on_error = on_error
+        self.deadline = time.monotonic() + self.timeout if self.timeout else None
+        self.connection.send((function, expression))
+        self.job = self.widget.after(POLL_INTERVAL, self.poll)
+
+    def poll(self):
+        self.job = None
+        try:
+            if self.connection.poll():
+                ok, value = self.connection.recv()
+                (self.on_result if ok else self.on_error)(value)
+                return
+        except (EOFError, OSError):
+            self.stop()
+            self.on_error("Worker exited")
+            return
+
+        if not self.process.is_alive():
+            self.stop()
+            self.on_error("Worker exited")
+        elif self.deadline is not None and time.monotonic() > self.deadline:
+            self.stop()
+            self.on_error("Timeout")
+        else:
+            self.job = self.widget.after(POLL_INTERVAL, self.poll)
+
+    def cancel(self):
+        if self.job is None:
+            return False
+        self.widget.after_cancel(self.job)
+        self.job = None
+        self.stop()
+        return True
+
+    def stop(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+            self.process = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def close(self):
+        self.cancel()
+        self.stop()
@@ -0,0 +1,58 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from engine import default_engine, format_display
+
+DEFAULT_CHUNKSIZE = 1000
+
+
+def calculate_line(line):
+    line = line.strip()
+    if not line:
+        return ""
+    try:
+        return format_display(default_engine.calculate(line)[1])
+    except Exception:
+        return "Error"
+
+
+def calculate_lines(lines):
+    return [calculate_line(line) for line in lines]
+
+
+def chunks(lines, chunksize):
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_results(lines, workers=1, chunksize=DEFAULT_CHUNKSIZE):
+    # Results come back in input order. With several workers only a bounded
+    # number of chunks is in flight at once, so memory does not grow with the
+    # size of the input.
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for line in lines:
+            yield calculate_line(line)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks(lines, chunksize):
+            pending.append(pool.submit(calculate_lines, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def run_batch(source, output, workers=1, chunksize=DEFAULT_CHUNKSIZE):
+    for result in iter_results(source, workers, chunksize):
+        output.write(result + "\n")
+    output.flush()
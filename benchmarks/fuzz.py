@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from math import sin, cos, tan, asin, acos, atan, log10, log, sqrt, pi, e, radians, degrees
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import Engine, CostLimitError, default_engine, format_display, preview  # noqa: E402
+
+DEFAULT_COUNT = 100000
+DEFAULT_DEPTH = 4
+MAX_REPORTED = 20  # mismatches and crashes listed in full
+
+FUNCTION_NAMES = ("sin", "cos", "tan", "asin", "acos", "atan", "log", "ln", "sqrt", "radians", "degrees")
+OPERATORS = ("+", "-", "*", "/", "^", "%", "//")
+
+# Exceptions the calculator turns into "Error"; anything else from the
+# engine is a crash
+EXPECTED_ERRORS = (ArithmeticError, ValueError, TypeError)
+
+
+def reference_calculate(expression):
+    # The "=" key as it was before the engine existed: eval() with the same
+    # names, the single-% shortcut and the same rounding. Returns what went to
+    # the history and the result the display showed str() of.
+    expression = expression.replace("^", "**")
+    expression = expression.replace("π", "pi")
+    expression = expression.replace("√", "sqrt")
+
+    if "%" in expression:
+        parts = expression.split("%")
+        if len(parts) == 2:
+            value = float(parts[0])
+            percent = float(parts[1])
+            return f"{value}% of {percent}", value * percent / 100
+
+    result = eval(expression, {"__builtins__": None}, {
+        "sin": sin,
+        "cos": cos,
+        "tan": tan,
+        "asin": asin,
+        "acos": acos,
+        "atan": atan,
+        "log": log10,
+        "ln": log,
+        "sqrt": sqrt,
+        "pi": pi,
+        "e": e,
+        "radians": radians,
+        "degrees": degrees
+    })
+    if isinstance(result, float):
+        if result.is_integer():
+            result = int(result)
+        else:
+            result = round(result, 10)
+    return expression, result
+
+
+class ExpressionGenerator:
+    # Random well-formed expressions as a user could type them: numbers,
+    # pi/e (also as π), operators including ^ and %, unary minus, nested
+    # parentheses and function calls (sqrt also as √).
+
+    def __init__(self, seed=0, depth=DEFAULT_DEPTH):
+        self.random = random.Random(seed)
+        self.depth = depth
+
+    def number(self):
+        r = self.random
+        kind = r.random()
+        if kind < 0.5:
+            return str(r.randint(0, 99))
+        if kind < 0.75:
+            return f"{r.randint(0, 999)}.{r.randint(0, 99)}"
+        if kind < 0.85:
+            return f".{r.randint(0, 9)}"
+        if kind < 0.95:
+            return r.choice(("pi", "e", "π"))
+        return str(r.randint(10 ** 9, 10 ** 15))
+
+    def expression(self, depth=0):
+        r = self.random
+        if depth >= self.depth or r.random() < 0.3:
+            return self.number()
+        kind = r.random()
+        if kind < 0.55:
+            left = self.expression(depth + 1)
+            right = self.expression(depth + 1)
+            return f"{left}{r.choice(OPERATORS)}{right}"
+        if kind < 0.7:
+            return f"({self.expression(depth + 1)})"
+        if kind < 0.8:
+            return f"-{self.expression(depth + 1)}"
+        if kind < 0.85:
+            return f"√({self.expression(depth + 1)})"
+        return f"{r.choice(FUNCTION_NAMES)}({self.expression(depth + 1)})"
+
+    def percent(self):
+        # The a%b shortcut only applies to exactly one %, usually between numbers
+        return f"{self.number()}%{self.number()}"
+
+    def __call__(self):
+        return self.percent() if self.random.random() < 0.05 else self.expression()
+
+
+def outcome(function, expression):
+    # ("ok", history text, result) or ("error", exception)
+    try:
+        text, result = function(expression)
+    except Exception as exc:
+        return ("error", exc)
+    return ("ok", text, result)
+
+
+def same(result, expected):
+    if result[0] != expected[0]:
+        return False
+    if result[0] == "error":
+        return True  # both show "Error", whatever the exception
+    a, b = result[2], expected[2]
+    # 1 and 1.0 display differently; nan is equal to nan here
+    return result[1] == expected[1] and type(a) is type(b) and (a == b or (a != a and b != b))
+
+
+def engine_preview(expression):
+    # The live preview has no history text; the reference's is used for it
+    return None, preview(expression)
+
+
+def run(arguments):
+    # Fuzz one seed; runs in a worker process when there are several
+    seed, count, depth = arguments
+    generate = ExpressionGenerator(seed, depth)
+    engine = Engine()
+    targets = {"calculate": engine.calculate, "preview": engine_preview}
+    seconds = {"reference": 0.0, **{name: 0.0 for name in targets}}
+    guarded = 0
+    errors = 0
+    mismatches = []
+    crashes = []
+
+    for _ in range(count):
+        expression = generate()
+        results = {}
+        for name, function in targets.items():
+            start = time.perf_counter()
+            results[name] = outcome(function, expression)
+            seconds[name] += time.perf_counter() - start
+        if any(result[0] == "error" and isinstance(result[1], CostLimitError) for result in results.values()):
+            # Refused by the cost guard, which the old eval() did not have;
+            # running it through eval() could take minutes
+            guarded += 1
+            continue
+
+        start = time.perf_counter()
+        expected = outcome(reference_calculate, expression)
+        seconds["reference"] += time.perf_counter() - start
+        if expected[0] == "error":
+            errors += 1
+
+        for name, result in results.items():
+            if result[0] == "error" and not isinstance(result[1], EXPECTED_ERRORS):
+                crashes.append({
+                    "target": name, "expression": expression,
+                    "error": f"{type(result[1]).__name__}: {result[1]}"
+                })
+                continue
+            if name == "preview" and result[0] == "ok":
+                result = ("ok", expected[1] if expected[0] == "ok" else None, result[2])
+            if same(result, expected):
+                continue
+            mismatches.append({
+                "target": name, "expression": expression,
+                "expected": describe(expected), "actual": describe(result)
+            })
+
+    # default_engine backs preview(); keep workers' caches from growing across seeds
+    default_engine.clear_cache()
+    return {
+        "count": count, "guarded": guarded, "errors": errors, "seconds": seconds,
+        "mismatches": mismatches, "crashes": crashes
+    }
+
+
+def describe(result):
+    if result[0] == "error":
+        return f"Error ({type(result[1]).__name__})"
+    value = format_display(result[2])
+    return value if result[1] is None else f"{result[1]} = {value}"
+
+
+def merge(reports):
+    total = {"count": 0, "guarded": 0, "errors": 0, "seconds": {}, "mismatches": [], "crashes": []}
+    for report in reports:
+        for key in ("count", "guarded", "errors"):
+            total[key] += report[key]
+        for name, seconds in report["seconds"].items():
+            total["seconds"][name] = total["seconds"].get(name, 0.0) + seconds
+        total["mismatches"].extend(report["mismatches"])
+        total["crashes"].extend(report["crashes"])
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the evaluation engine against the original eval() on random expressions"
+    )
+    parser.add_argument("--count", type=int, default=DEFAULT_COUNT, help="expressions to try")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first worker; a run is reproducible")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="maximum nesting of generated expressions")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (0 for one per CPU)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count() or 1
+    shares = [args.count // workers + (i < args.count % workers) for i in range(workers)]
+    jobs = [(args.seed + i, share, args.depth) for i, share in enumerate(shares) if share]
+    start = time.perf_counter()
+    if workers == 1:
+        reports = [run(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            reports = list(pool.map(run, jobs))
+    report = merge(reports)
+    report["elapsed"] = time.perf_counter() - start
+    compared = report["count"] - report["guarded"]
+    # Evaluations per second of CPU time spent in each, summed over workers
+    report["throughput"] = {
+        name: (report["count"] if name != "reference" else compared) / seconds if seconds else None
+        for name, seconds in report["seconds"].items()
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print(f"{report['count']:,} expressions in {report['elapsed']:.1f}s, seed {args.seed}, "
+              f"{workers} worker{'s' if workers > 1 else ''}")
+        print(f"{compared:,} compared ({report['errors']:,} errors in both), "
+              f"{report['guarded']:,} refused by the cost guard")
+        for name, rate in sorted(report["throughput"].items()):
+            print(f"{name:12} {rate:12,.0f} evaluations/s" if rate else f"{name:12} {'-':>12}")
+        print(f"{len(report['mismatches']):,} mismatches, {len(report['crashes']):,} crashes")
+        for mismatch in report["mismatches"][:MAX_REPORTED]:
+            print(f"MISMATCH {mismatch['target']}: {mismatch['expression']!r} "
+                  f"expected {mismatch['expected']}, got {mismatch['actual']}")
+        for crash in report["crashes"][:MAX_REPORTED]:
+            print(f"CRASH {crash['target']}: {crash['expression']!r} {crash['error']}")
+    sys.exit(1 if report["mismatches"] or report["crashes"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter for every measurement so nothing is warm.
+# first_frame is when the deferred startup work begins, which only happens
+# after the first expose of the window has been drawn.
+PROBE = """
+import json, time
+start = time.perf_counter()
+import calculator
+imported = time.perf_counter()
+marks = {}
+finish_startup = calculator.AdvancedCalculator.finish_startup
+def timed_finish_startup(self):
+    if not self.startup_done:
+        marks["first_frame"] = time.perf_counter()
+        finish_startup(self)
+        marks["ready"] = time.perf_counter()
+        self.after(0, self.on_close)
+    else:
+        finish_startup(self)
+calculator.AdvancedCalculator.finish_startup = timed_finish_startup
+app = calculator.AdvancedCalculator()
+app.mainloop()
+print(json.dumps({
+    "import": imported - start,
+    "first_frame": marks["first_frame"] - start,
+    "ready": marks["ready"] - start,
+}))
+"""
+
+
+def measure(history_entries):
+    with tempfile.TemporaryDirectory() as cwd:
+        if history_entries:
+            with open(os.path.join(cwd, "calculator_history.jsonl"), "w") as f:
+                for i in range(history_entries):
+                    record = {"time": i, "expression": f"{i}*2", "result": str(i * 2)}
+                    f.write(json.dumps(record) + "\n")
+        env = dict(os.environ, PYTHONPATH=ROOT, CALCULATOR_HISTORY=os.path.join(cwd, "calculator_history.jsonl"))
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            cwd=cwd, env=env, capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure calculator import time and time to first frame")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--history", type=int, default=1000, help="entries in the history log")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        sys.exit("startup benchmark needs a display; run it under xvfb-run")
+
+    runs = [measure(args.history) for _ in range(args.runs)]
+    results = {
+        metric: {
+            "median": statistics.median(run[metric] for run in runs),
+            "min": min(run[metric] for run in runs),
+            "max": max(run[metric] for run in runs),
+        }
+        for metric in ("import", "first_frame", "ready")
+    }
+
+    if args.json:
+        print(json.dumps({"runs": args.runs, "history": args.history, "results": results}, indent=2))
+    else:
+        for metric, stats in results.items():
+            print(f"{metric:12} median {stats['median'] * 1000:8.1f} ms  "
+                  f"min {stats['min'] * 1000:8.1f} ms  max {stats['max'] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import Engine  # noqa: E402
+from history_store import HistoryStore  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLD = 0.10  # relative slowdown reported as a regression
+
+CORPUS = {
+    "arithmetic": ["1+2", "3*4-5", "12/4+7", "(1+2)*(3+4)", "100-99.5", "2^10", "7//2+3"],
+    "trig": ["sin(cos(tan(0.5)))", "asin(sin(0.3))+acos(0.2)", "sqrt(sin(1)^2+cos(1)^2)",
+             "atan(tan(1.2))*ln(e)", "log(sin(pi/4)*100)"],
+    "percent": ["50%200", "12.5%80", "3%1000", "99%1"],
+    "large_power": ["2^100000", "3^50000+1", "7^20000*11", "(2^4096)//(3^1000)"],
+}
+HISTORY_SIZES = (1000, 10000, 100000)
+
+
+MIN_ROUND = 0.05  # seconds; short calls are repeated until a round takes this long
+
+
+def timed(function, repeat=5, number=None):
+    # Median seconds per call over `repeat` rounds of `number` calls. Without
+    # a number, it is doubled until one round takes at least MIN_ROUND.
+    if number is None:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            if time.perf_counter() - start >= MIN_ROUND:
+                break
+            number *= 2
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        rounds.append((time.perf_counter() - start) / number)
+    return statistics.median(rounds)
+
+
+def bench_evaluate(results, quick):
+    repeat = 3 if quick else 7
+    for name, expressions in CORPUS.items():
+        engine = Engine()
+
+        def warm():
+            for expression in expressions:
+                engine.calculate(expression)
+
+        def cold():
+            engine.clear_cache()
+            warm()
+
+        for label, function in (("warm", warm), ("cold", cold)):
+            seconds = timed(function, repeat)
+            results[f"evaluate.{name}.{label}"] = {
+                "value": len(expressions) / seconds, "unit": "expr/s", "better": "higher"
+            }
+
+
+def write_history(path, entries):
+    with open(path, "w") as f:
+        for i in range(entries):
+            record = {"time": i, "expression": f"{i}*2+sin({i})", "result": str(i * 2)}
+            f.write(json.dumps(record) + "\n")
+
+
+def bench_history(results, quick):
+    sizes = HISTORY_SIZES[:2] if quick else HISTORY_SIZES
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "history.jsonl")
+        for size in sizes:
+            write_history(path, size)
+            store = HistoryStore(path, capacity=size * 2)
+            results[f"history.load.{size}"] = {
+                "value": timed(store.recent), "unit": "s", "better": "lower"
+            }
+            results[f"history.save.{size}"] = {
+                "value": timed(lambda: store.append("1+1", "2")), "unit": "s", "better": "lower"
+            }
+            results[f"history.compact.{size}"] = {
+                "value": timed(store.compact, repeat=3), "unit": "s", "better": "lower"
+            }
+            results[f"history.page.{size}"] = {
+                "value": timed(lambda: store.newest(size // 2, 8)), "unit": "s", "better": "lower"
+            }
+            store.close()
+
+
+def bench_gui(results, quick):
+    # Needs a display; under CI run the suite with xvfb-run
+    import calculator
+
+    sizes = HISTORY_SIZES[:2] if quick else HISTORY_SIZES
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "calculator_history.jsonl")
+            write_history(path, size)
+            app = calculator.AdvancedCalculator(history_path=path)
+            app.withdraw()
+            app.finish_startup()
+            app.update()
+
+            def display():
+                app.update_history_display()
+                app.update_idletasks()
+
+            themes = list(app.themes)
+
+            def theme():
+                for name in themes:
+                    app.set_theme(name)
+                app.update_idletasks()
+
+            def add():
+                app.add_to_history("1+1", "2")
+                app.update_idletasks()
+
+            results[f"gui.update_history_display.{size}"] = {
+                "value": timed(display), "unit": "s", "better": "lower"
+            }
+            results[f"gui.apply_theme.{size}"] = {
+                "value": timed(theme) / len(themes), "unit": "s", "better": "lower"
+            }
+            results[f"gui.add_to_history.{size}"] = {
+                "value": timed(add), "unit": "s", "better": "lower"
+            }
+            app.on_close()
+
+
+def bench_startup(results, quick):
+    import startup
+
+    runs = [startup.measure(1000) for _ in range(3 if quick else 10)]
+    for metric in ("import", "first_frame", "ready"):
+        results[f"startup.{metric}"] = {
+            "value": statistics.median(run[metric] for run in runs), "unit": "s", "better": "lower"
+        }
+
+
+GROUPS = {
+    "evaluate": bench_evaluate,
+    "history": bench_history,
+    "gui": bench_gui,
+    "startup": bench_startup,
+}
+
+
+def compare(results, baseline, threshold):
+    # Returns (name, change) for every benchmark slower than the baseline by
+    # more than threshold; change is the relative slowdown.
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["value"], result["value"]
+        if result["better"] == "higher":
+            change = before / after - 1 if after else float("inf")
+        else:
+            change = after / before - 1 if before else 0.0
+        result["change"] = change
+        if change > threshold:
+            regressions.append((name, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calculator benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="fewer rounds and smaller histories")
+    parser.add_argument("--only", action="append", choices=list(GROUPS),
+                        help="run only these groups (repeatable)")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    groups = args.only or list(GROUPS)
+    has_display = not sys.platform.startswith("linux") or os.environ.get("DISPLAY")
+    results = {}
+    skipped = []
+    for group in groups:
+        if group in ("gui", "startup") and not has_display:
+            skipped.append(group)
+            continue
+        GROUPS[group](results, args.quick)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "quick": args.quick,
+        "skipped": skipped,
+        "results": results,
+        "regressions": [name for name, change in regressions],
+    }
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        for name, result in sorted(results.items()):
+            line = f"{name:40} {result['value']:14.6g} {result['unit']:7}"
+            if "change" in result:
+                line += f" {result['change']:+8.1%} vs baseline"
+            print(line)
+        for group in skipped:
+            print(f"skipped {group}: needs a display; run under xvfb-run")
+        for name, change in regressions:
+            print(f"REGRESSION {name}: {change:+.1%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,32 @@
 import tkinter as tk
-from tkinter import font as tkfont, messagebox
-from math import *
+from tkinter import font as tkfont
+from math import sin, cos, tan, asin, acos, atan, log10, log, sqrt, radians, degrees
 import json
-import os
+import sys
+import threading
+from collections import deque
+
+# Anything not needed for the first frame (dialogs, the batch runner, the
+# history search index, NumPy) is imported where it is first used.
+from background import BackgroundEvaluator, DEFAULT_TIMEOUT, DEFAULT_MEMORY_LIMIT
+from engine import EvaluationError, calculate_with, format_display, format_result, preview_with, tokenize
+from history_store import HistoryStore, DEFAULT_CAPACITY, format_entry
+from sheet import Sheet, parse_assignment, update_sheet
+
+PREVIEW_DELAY = 150  # milliseconds of typing pause before the preview updates
+PREVIEW_TIMEOUT = 2.0
+HISTORY_POLL = 1000  # milliseconds between checks for entries from other windows
+PRECISIONS = (32, 50, 100, 1000)  # digits offered in the Mode menu
+
+def joined_input(current, value):
+    # A lone 0 is replaced by what is typed next, except a decimal point
+    if current == "0" and not value.startswith("."):
+        return value
+    return current + value
 
 class AdvancedCalculator(tk.Tk):
-    def __init__(self):
+    def __init__(self, eval_timeout=DEFAULT_TIMEOUT, eval_memory_limit=DEFAULT_MEMORY_LIMIT,
+                 history_capacity=DEFAULT_CAPACITY, history_path=None):
         super().__init__()
         
         self.title("Advanced Scientific Calculator")
@@ -13,7 +34,9 @@ class AdvancedCalculator(tk.Tk):
         self.resizable(False, False)
         self.theme = "dark"  # default theme
         self.history = []
-        self.load_history()
+        self.history_store = HistoryStore(history_path, capacity=history_capacity)
+        self.history_error_shown = False
+        self.startup_done = False
         
         # Custom fonts
         self.title_font = tkfont.Font(family="Helvetica", size=14, weight="bold")
@@ -58,35 +81,113 @@ class AdvancedCalculator(tk.Tk):
             }
         }
         
+        self.styles = {name: self.build_styles(theme) for name, theme in self.themes.items()}
+        self.widgets = {}
+        self.register_widget("window", self)
+        
         # Variables
         self.current_input = tk.StringVar(value="0")
         self.total_expression = tk.StringVar(value="")
         self.memory = 0
         self.radians = True  # True for radians, False for degrees
+        self.precision = None  # digits in arbitrary-precision mode, None for floats
+        self.sheet = Sheet(self.radians)  # named variables such as a = 3
+        self.variables_window = None
+        
+        # Debug menu: hot-path timings and whole-session profiles, both off by default
+        self.instrumentation = None
+        self.timings_enabled = tk.BooleanVar(value=False)
+        self.profiler = None
+        
+        # Expressions are evaluated in a worker process with a time and memory budget
+        self.evaluator = BackgroundEvaluator(self, eval_timeout, eval_memory_limit)
+        self.pending_input = None
+        
+        # Changes to the variables recompute formulas in a worker of their own,
+        # with the same budget, one change at a time and in order
+        self.sheet_evaluator = BackgroundEvaluator(self, eval_timeout, eval_memory_limit)
+        self.sheet_updates = deque()  # (action, args, on_done, on_error), the first one running
+        
+        # Live preview of the result while typing, computed in its own worker
+        self.preview_evaluator = BackgroundEvaluator(self, PREVIEW_TIMEOUT, eval_memory_limit)
+        self.preview_job = None
+        self.preview_text = tk.StringVar(value="")
+        
+        # Keystrokes waiting for the next idle cycle to be shown
+        self.typed = []
+        self.typing_job = None
         
         self.create_menu()
         self.create_display()
         self.create_buttons()
-        self.create_history_panel()
-        self.apply_theme()
         self.bind_keys()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # History is loaded and its panel built once the first frame is on screen
+        self.input_label.bind("<Expose>", self.on_first_expose)
+        self.after(500, self.finish_startup)  # in case the window is never exposed
+        
+    def on_first_expose(self, event):
+        self.input_label.unbind("<Expose>")
+        # Redraws queued by this expose run first, then the deferred startup work
+        self.after_idle(self.finish_startup)
+    
+    def finish_startup(self):
+        if self.startup_done:
+            return
+        self.startup_done = True
+        self.load_history()
+        self.create_history_panel()
+        self.history_store.maybe_compact()  # index the log in the background
+        self.evaluator.start()
+        self.after(HISTORY_POLL, self.poll_history)
         
     def create_menu(self):
         menubar = tk.Menu(self)
         
         # Theme menu
-        theme_menu = tk.Menu(menubar, tearoff=0)
-        theme_menu.add_command(label="Dark", command=lambda: self.set_theme("dark"))
-        theme_menu.add_command(label="Light", command=lambda: self.set_theme("light"))
-        theme_menu.add_command(label="Blue", command=lambda: self.set_theme("blue"))
-        menubar.add_cascade(label="Themes", menu=theme_menu)
+        self.theme_menu = tk.Menu(menubar, tearoff=0)
+        self.theme_menu.add_command(label="Load Theme File…", command=self.open_theme_file)
+        self.theme_menu.add_separator()
+        for name in self.themes:
+            self.theme_menu.add_command(label=name.title(), command=lambda x=name: self.set_theme(x))
+        menubar.add_cascade(label="Themes", menu=self.theme_menu)
         
         # Mode menu
         mode_menu = tk.Menu(menubar, tearoff=0)
         mode_menu.add_command(label="Radians", command=lambda: self.set_radians(True))
         mode_menu.add_command(label="Degrees", command=lambda: self.set_radians(False))
+        mode_menu.add_separator()
+        mode_menu.add_command(label="Standard Precision", command=lambda: self.set_precision(None))
+        for digits in PRECISIONS:
+            mode_menu.add_command(label=f"{digits} Digits", command=lambda x=digits: self.set_precision(x))
+        mode_menu.add_command(label="Custom Digits…", command=self.ask_precision)
         menubar.add_cascade(label="Mode", menu=mode_menu)
         
+        # Edit menu
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        edit_menu.add_command(label="Paste", accelerator="Ctrl+V", command=self.paste)
+        menubar.add_cascade(label="Edit", menu=edit_menu)
+        
+        # Tools menu
+        self.tools_menu = tk.Menu(menubar, tearoff=0)
+        self.tools_menu.add_command(label="Plot…", command=self.open_plot)
+        self.tools_menu.add_command(label="Table…", command=self.open_table)
+        self.tools_menu.add_command(label="Solve…", command=self.open_solver)
+        self.tools_menu.add_command(label="Variables…", command=self.open_variables)
+        self.tools_menu.add_command(label="Statistics…", command=self.open_statistics)
+        menubar.add_cascade(label="Tools", menu=self.tools_menu)
+        
+        # Debug menu
+        debug_menu = tk.Menu(menubar, tearoff=0)
+        debug_menu.add_checkbutton(label="Record Timings", variable=self.timings_enabled, command=self.toggle_timings)
+        debug_menu.add_command(label="Show Timings…", command=self.open_timings)
+        debug_menu.add_separator()
+        debug_menu.add_command(label="Start cProfile", command=lambda: self.start_profile("cprofile"))
+        debug_menu.add_command(label="Start Sampling Profile", command=lambda: self.start_profile("sampling"))
+        debug_menu.add_command(label="Stop Profile and Save…", command=self.stop_profile)
+        menubar.add_cascade(label="Debug", menu=debug_menu)
+        
         # Help menu
         help_menu = tk.Menu(menubar, tearoff=0)
         help_menu.add_command(label="About", command=self.show_about)
@@ -97,60 +198,60 @@ class AdvancedCalculator(tk.Tk):
     
     def create_display(self):
         # Frame for display
-        display_frame = tk.Frame(self, bg=self.themes[self.theme]["display_bg"], padx=10, pady=10)
+        display_frame = self.register_widget("display_frame", tk.Frame(self, padx=10, pady=10))
         display_frame.pack(fill="x")
         
         # Mode indicator
-        self.mode_label = tk.Label(
+        self.mode_label = self.register_widget("display", tk.Label(
             display_frame, 
-            text="RAD" if self.radians else "DEG",
+            text=self.mode_text(),
             font=self.button_font,
-            bg=self.themes[self.theme]["display_bg"],
-            fg=self.themes[self.theme]["display_fg"],
             anchor="w"
-        )
+        ))
         self.mode_label.pack(fill="x")
         
         # Memory label
-        self.memory_label = tk.Label(
+        self.memory_label = self.register_widget("display", tk.Label(
             display_frame, 
             text="",
             font=self.button_font,
-            bg=self.themes[self.theme]["display_bg"],
-            fg=self.themes[self.theme]["display_fg"],
             anchor="e"
-        )
+        ))
         self.memory_label.pack(fill="x")
         
         # Total expression label
-        total_label = tk.Label(
+        total_label = self.register_widget("display", tk.Label(
             display_frame, 
             textvariable=self.total_expression, 
             font=self.button_font,
-            bg=self.themes[self.theme]["display_bg"],
-            fg=self.themes[self.theme]["display_fg"],
             anchor="e"
-        )
+        ))
         total_label.pack(fill="x")
         
         # Current input label
-        input_label = tk.Label(
+        self.input_label = self.register_widget("display", tk.Label(
             display_frame, 
             textvariable=self.current_input, 
             font=self.display_font,
-            bg=self.themes[self.theme]["display_bg"],
-            fg=self.themes[self.theme]["display_fg"],
             anchor="e"
-        )
-        input_label.pack(fill="x")
+        ))
+        self.input_label.pack(fill="x")
+        
+        # Preview of the result while typing
+        self.register_widget("display", tk.Label(
+            display_frame,
+            textvariable=self.preview_text,
+            font=self.history_font,
+            anchor="e"
+        )).pack(fill="x")
     
     def create_buttons(self):
         # Main button frame
-        button_frame = tk.Frame(self, bg=self.themes[self.theme]["bg"])
+        button_frame = self.register_widget("frame", tk.Frame(self))
         button_frame.pack(expand=True, fill="both", padx=5, pady=5)
         
         # Scientific buttons (top row)
-        sci_frame = tk.Frame(button_frame, bg=self.themes[self.theme]["bg"])
+        sci_frame = self.register_widget("frame", tk.Frame(button_frame))
         sci_frame.grid(row=0, column=0, columnspan=5, sticky="nsew")
         
         sci_buttons = [
@@ -160,22 +261,20 @@ class AdvancedCalculator(tk.Tk):
         
         for i, text in enumerate(sci_buttons):
             sci_frame.columnconfigure(i, weight=1)
-            btn = tk.Button(
+            btn = self.register_widget("sci_button", tk.Button(
                 sci_frame,
                 text=text,
                 font=self.button_font,
-                bg=self.themes[self.theme]["sci_button_bg"],
-                fg=self.themes[self.theme]["button_fg"],
                 activebackground="#555555",
                 activeforeground="white",
                 relief="flat",
                 borderwidth=0,
                 command=lambda x=text: self.on_scientific_button(x)
-            )
+            ))
             btn.grid(row=0, column=i, sticky="nsew", padx=2, pady=2)
         
         # Standard calculator buttons
-        std_frame = tk.Frame(button_frame, bg=self.themes[self.theme]["bg"])
+        std_frame = self.register_widget("frame", tk.Frame(button_frame))
         std_frame.grid(row=1, column=0, columnspan=5, sticky="nsew")
         
         button_layout = [
@@ -194,116 +293,213 @@ class AdvancedCalculator(tk.Tk):
                 
                 # Special styling
                 if button_text == "=":
-                    bg_color = self.themes[self.theme]["op_button_bg"]
-                elif button_text in ["⌫", "C", "AC"]:
-                    bg_color = self.themes[self.theme]["button_bg"]
+                    role = "op_button"
                 elif button_text in ["MC", "MR", "M+", "M-"]:
-                    bg_color = self.themes[self.theme]["sci_button_bg"]
+                    role = "sci_button"
                 else:
-                    bg_color = self.themes[self.theme]["button_bg"]
+                    role = "button"
                 
-                button = tk.Button(
+                button = self.register_widget(role, tk.Button(
                     std_frame,
                     text=button_text,
                     font=self.button_font,
-                    bg=bg_color,
-                    fg=self.themes[self.theme]["button_fg"],
                     activebackground="#555555",
                     activeforeground="white",
                     relief="flat",
                     borderwidth=0,
                     command=lambda x=button_text: self.on_button_click(x)
-                )
+                ))
                 button.grid(row=i, column=j, sticky="nsew", padx=2, pady=2)
     
     def create_history_panel(self):
-        history_frame = tk.Frame(self, bg=self.themes[self.theme]["history_bg"])
+        history_frame = self.register_widget("history_frame", tk.Frame(self))
         history_frame.pack(fill="both", expand=True, padx=5, pady=5)
         
-        tk.Label(
+        self.register_widget("history", tk.Label(
             history_frame,
             text="History",
-            font=self.title_font,
-            bg=self.themes[self.theme]["history_bg"],
-            fg=self.themes[self.theme]["history_fg"]
-        ).pack(fill="x")
+            font=self.title_font
+        )).pack(fill="x")
         
-        self.history_text = tk.Text(
+        # Search box, e.g. "sqrt" or "between 10 and 20"
+        self.history_query = tk.StringVar()
+        search_entry = self.register_widget("history_input", tk.Entry(
+            history_frame,
+            textvariable=self.history_query,
+            font=self.history_font,
+            relief="flat"
+        ))
+        search_entry.pack(fill="x", pady=(0, 5))
+        # Skip the window's calculator key bindings while typing a query
+        search_entry.bindtags((str(search_entry), "Entry", "all"))
+        self.history_query.trace_add("write", lambda *args: self.search_history())
+        
+        # Only the visible rows are rendered, fetched from the history store
+        self.history_rows = 8
+        self.history_top = 0  # position of the first visible entry, 0 = newest
+        self.history_window = []
+        self.history_matches = None  # ids of matching entries while searching
+        self.history_index = None
+        self.history_index_builder = None
+        self.history_index_pending = []
+        
+        self.history_text = self.register_widget("history", tk.Text(
             history_frame,
             font=self.history_font,
-            bg=self.themes[self.theme]["history_bg"],
-            fg=self.themes[self.theme]["history_fg"],
             state="disabled",
-            height=8,
+            height=self.history_rows,
             padx=5,
             pady=5,
-            wrap="word"
-        )
+            wrap="none",
+            cursor="hand2"
+        ))
         self.history_text.pack(fill="both", expand=True)
         
         # Add scrollbar
-        scrollbar = tk.Scrollbar(self.history_text)
-        scrollbar.pack(side="right", fill="y")
-        self.history_text.config(yscrollcommand=scrollbar.set)
-        scrollbar.config(command=self.history_text.yview)
+        self.history_scrollbar = tk.Scrollbar(self.history_text, command=self.scroll_history)
+        self.history_scrollbar.pack(side="right", fill="y")
+        
+        self.history_text.bind("<Button-1>", self.on_history_click)
+        self.history_text.bind("<MouseWheel>", lambda event: self.scroll_history("scroll", -1 if event.delta > 0 else 1, "units"))
+        self.history_text.bind("<Button-4>", lambda event: self.scroll_history("scroll", -1, "units"))
+        self.history_text.bind("<Button-5>", lambda event: self.scroll_history("scroll", 1, "units"))
         
         # Populate with existing history
         self.update_history_display()
     
+    def build_styles(self, theme):
+        # Widget options for every role, computed once per theme
+        return {
+            "window": {"bg": theme["bg"]},
+            "frame": {"bg": theme["bg"]},
+            "display_frame": {"bg": theme["display_bg"]},
+            "display": {"bg": theme["display_bg"], "fg": theme["display_fg"]},
+            "button": {"bg": theme["button_bg"], "fg": theme["button_fg"]},
+            "op_button": {"bg": theme["op_button_bg"], "fg": theme["button_fg"]},
+            "sci_button": {"bg": theme["sci_button_bg"], "fg": theme["button_fg"]},
+            "history_frame": {"bg": theme["history_bg"]},
+            "history": {"bg": theme["history_bg"], "fg": theme["history_fg"]},
+            "history_input": {
+                "bg": theme["history_bg"],
+                "fg": theme["history_fg"],
+                "insertbackground": theme["history_fg"]
+            }
+        }
+    
+    def register_widget(self, role, widget):
+        # Widgets are grouped by role at creation so themes apply without searching the tree
+        self.widgets.setdefault(role, []).append(widget)
+        widget.configure(**self.styles[self.theme][role])
+        return widget
+    
     def apply_theme(self):
-        theme = self.themes[self.theme]
-        self.configure(bg=theme["bg"])
-        
-        # Update display
-        for widget in self.winfo_children():
-            if isinstance(widget, tk.Frame):
-                widget.configure(bg=theme["bg"])
-        
-        # Update all buttons (this is simplified - in a real app you'd track all buttons)
-        for child in self.winfo_children():
-            if isinstance(child, tk.Frame):
-                for widget in child.winfo_children():
-                    if isinstance(widget, tk.Button):
-                        if widget["text"] == "=":
-                            widget.config(bg=theme["op_button_bg"], fg=theme["button_fg"])
-                        elif widget["text"] in ["⌫", "C", "AC"]:
-                            widget.config(bg=theme["button_bg"], fg=theme["button_fg"])
-                        elif widget["text"] in ["MC", "MR", "M+", "M-"]:
-                            widget.config(bg=theme["sci_button_bg"], fg=theme["button_fg"])
-                        else:
-                            widget.config(bg=theme["button_bg"], fg=theme["button_fg"])
+        styles = self.styles[self.theme]
+        for role, widgets in self.widgets.items():
+            options = styles[role]
+            # Forget widgets of tool windows that have been closed
+            widgets[:] = [widget for widget in widgets if widget.winfo_exists()]
+            for widget in widgets:
+                widget.configure(**options)
+    
+    def load_theme_file(self, path):
+        # A JSON object of theme name -> colors; missing colors are taken from "dark"
+        with open(path, "r") as f:
+            themes = json.load(f)
+        for name, colors in themes.items():
+            theme = dict(self.themes["dark"], **colors)
+            for color in theme.values():
+                self.winfo_rgb(color)  # raises TclError for unknown colors
+            self.add_theme(name, theme)
+        return list(themes)
+    
+    def add_theme(self, name, theme):
+        if name not in self.themes:
+            self.theme_menu.add_command(label=name.title(), command=lambda: self.set_theme(name))
+        self.themes[name] = theme
+        self.styles[name] = self.build_styles(theme)
+    
+    def open_theme_file(self):
+        from tkinter import filedialog, messagebox
+        path = filedialog.askopenfilename(
+            title="Load Theme",
+            filetypes=[("Theme files", "*.json"), ("All files", "*")]
+        )
+        if not path:
+            return
+        try:
+            names = self.load_theme_file(path)
+        except (OSError, ValueError, AttributeError, TypeError, tk.TclError) as exc:
+            messagebox.showerror("Load Theme", f"Could not load {path}:\n{exc}")
+            return
+        if names:
+            self.set_theme(names[0])
     
     def bind_keys(self):
         self.bind("<Return>", lambda event: self.evaluate())
-        self.bind("<Escape>", lambda event: self.clear_all())
+        self.bind("<Escape>", lambda event: self.cancel_or_clear())
         self.bind("<BackSpace>", lambda event: self.backspace())
         
         # Number keys
         for num in "0123456789":
-            self.bind(num, lambda event, x=num: self.add_to_input(x))
+            self.bind(num, lambda event, x=num: self.type_text(x))
             
         # Operator keys
-        self.bind("+", lambda event: self.add_to_input("+"))
-        self.bind("-", lambda event: self.add_to_input("-"))
-        self.bind("*", lambda event: self.add_to_input("*"))
-        self.bind("/", lambda event: self.add_to_input("/"))
-        self.bind("^", lambda event: self.add_to_input("^"))
-        self.bind("%", lambda event: self.add_to_input("%"))
-        self.bind(".", lambda event: self.add_to_input("."))
-        self.bind("(", lambda event: self.add_to_input("("))
-        self.bind(")", lambda event: self.add_to_input(")"))
+        self.bind("+", lambda event: self.type_text("+"))
+        self.bind("-", lambda event: self.type_text("-"))
+        self.bind("*", lambda event: self.type_text("*"))
+        self.bind("/", lambda event: self.type_text("/"))
+        self.bind("^", lambda event: self.type_text("^"))
+        self.bind("%", lambda event: self.type_text("%"))
+        self.bind(".", lambda event: self.type_text("."))
+        self.bind("(", lambda event: self.type_text("("))
+        self.bind(")", lambda event: self.type_text(")"))
         
         # Scientific functions
-        self.bind("p", lambda event: self.add_to_input("pi"))
-        self.bind("e", lambda event: self.add_to_input("e"))
+        self.bind("p", lambda event: self.type_text("pi"))
+        self.bind("e", lambda event: self.type_text("e"))
+        
+        # Paste
+        self.bind("<Control-v>", lambda event: self.paste())
+        self.bind("<Shift-Insert>", lambda event: self.paste())
+        if sys.platform == "darwin":
+            self.bind("<Command-v>", lambda event: self.paste())
     
     def set_theme(self, theme_name):
         self.theme = theme_name
         self.apply_theme()
     
+    def mode_text(self):
+        text = "RAD" if self.radians else "DEG"
+        if self.precision is not None:
+            text += f"  {self.precision} digits"
+        return text
+    
     def set_radians(self, radians):
         self.radians = radians
-        self.mode_label.config(text="RAD" if radians else "DEG")
+        self.mode_label.config(text=self.mode_text())
+        if len(self.sheet):
+            self.update_sheet(None, (), lambda updated: None)
+        else:
+            self.sheet.set_radians(radians)
+        self.schedule_preview()
+    
+    def set_precision(self, digits):
+        self.precision = digits
+        self.mode_label.config(text=self.mode_text())
+    
+    def ask_precision(self):
+        from tkinter import simpledialog
+        from precision import MAX_DIGITS
+        digits = simpledialog.askinteger(
+            "Precision",
+            "Significant digits:",
+            parent=self,
+            initialvalue=self.precision or 50,
+            minvalue=1,
+            maxvalue=MAX_DIGITS
+        )
+        if digits is not None:
+            self.set_precision(digits)
     
     def update_memory_label(self):
         if self.memory != 0:
@@ -312,42 +508,283 @@ class AdvancedCalculator(tk.Tk):
             self.memory_label.config(text="")
     
     def add_to_history(self, expression, result):
-        entry = f"{expression} = {result}"
-        self.history.append(entry)
+        self.finish_startup()
+        self.merge_history_entry(self.save_history(expression, result))
+    
+    def poll_history(self):
+        # Other calculator windows share the log; merge what they added
+        try:
+            records = self.history_store.changes()
+        except OSError:
+            records = []
+        if records is None:
+            # Rewritten by another window's compaction: start from the new file
+            self.load_history()
+            self.history_index = None
+            self.history_index_pending = []
+            self.history_store.maybe_compact()
+            if self.history_matches is not None:
+                self.history_matches = None
+                self.build_history_index()  # searches again once rebuilt
+            self.history_top = 0
+            self.update_history_display()
+        else:
+            for record in records:
+                self.merge_history_entry(record)
+        self.after(HISTORY_POLL, self.poll_history)
+    
+    def merge_history_entry(self, record):
+        self.history.append(format_entry(record))
+        
+        # Only the most recent page is kept in memory, the rest stays on disk
+        if len(self.history) > self.history_store.page_size:
+            self.history = self.history[-self.history_store.page_size:]
         
-        # Keep only the last 50 entries
-        if len(self.history) > 50:
-            self.history = self.history[-50:]
+        if self.history_index is not None:
+            self.history_index.add(record)
+        elif self.history_index_builder is not None:
+            self.history_index_pending.append(record)
         
+        if self.history_matches is not None:
+            self.search_history()
+        else:
+            self.show_new_history_entry(record)
+    
+    def history_total(self):
+        if self.history_matches is not None:
+            return len(self.history_matches)
+        count = self.history_store.count
+        return len(self.history) if count is None else count
+    
+    def history_slice(self, start, count):
+        if self.history_matches is None:
+            return self.history_store.newest(start, count)
+        records = self.history_index.records
+        return [records[i] for i in self.history_matches[start:start + count]]
+    
+    def search_history(self):
+        query = self.history_query.get()
+        if not query.strip():
+            self.history_matches = None
+        elif self.history_index is None:
+            self.build_history_index()
+            return
+        else:
+            self.history_matches = self.history_index.search(query)
+        self.history_top = 0
         self.update_history_display()
-        self.save_history()
+    
+    def build_history_index(self):
+        # The whole log is read and indexed in a thread, then handed over via after()
+        if self.history_index_builder is not None:
+            return
+        from history_index import HistoryIndex
+        
+        result = []
+        records = self.history_store.records
+        self.history_index_builder = threading.Thread(
+            target=lambda: result.append(HistoryIndex(records())),
+            daemon=True
+        )
+        self.history_index_builder.start()
+        self.after(50, self.finish_history_index, result)
+    
+    def finish_history_index(self, result):
+        from history_index import HistoryIndex
+        
+        if self.history_index_builder.is_alive():
+            self.after(50, self.finish_history_index, result)
+            return
+        self.history_index_builder = None
+        self.history_index = result[0] if result else HistoryIndex()
+        
+        # Entries added while the log was being read may already be indexed
+        records = self.history_index.records
+        last_time = records[-1]["time"] if records and records[-1]["time"] is not None else 0
+        for record in self.history_index_pending:
+            if record.get("time", 0) > last_time:
+                self.history_index.add(record)
+        self.history_index_pending = []
+        self.search_history()
     
     def update_history_display(self):
+        self.history_window = self.history_slice(self.history_top, self.history_rows)
+        
         self.history_text.config(state="normal")
         self.history_text.delete(1.0, "end")
-        
-        for item in reversed(self.history):
-            self.history_text.insert("end", item + "\n")
-        
+        self.history_text.insert("end", "\n".join(format_entry(record) for record in self.history_window))
         self.history_text.config(state="disabled")
-        self.history_text.see("end")
+        self.update_history_scrollbar()
     
-    def save_history(self):
+    def show_new_history_entry(self, record):
+        if self.history_top > 0:
+            # Scrolled back: keep the entries being looked at in place
+            self.history_top += 1
+        else:
+            self.history_window.insert(0, record)
+            del self.history_window[self.history_rows:]
+            
+            self.history_text.config(state="normal")
+            self.history_text.insert(1.0, format_entry(record) + ("\n" if len(self.history_window) > 1 else ""))
+            self.history_text.delete(f"{self.history_rows}.end", "end")
+            self.history_text.config(state="disabled")
+        self.update_history_scrollbar()
+    
+    def update_history_scrollbar(self):
+        total = self.history_total()
+        if total <= self.history_rows:
+            self.history_scrollbar.set(0, 1)
+        else:
+            self.history_scrollbar.set(self.history_top / total, (self.history_top + self.history_rows) / total)
+    
+    def scroll_history(self, action, amount, unit=None):
+        total = self.history_total()
+        if action == "moveto":
+            top = int(float(amount) * total)
+        else:
+            top = self.history_top + int(amount) * (self.history_rows if unit == "pages" else 1)
+        top = max(0, min(top, total - self.history_rows))
+        
+        if top != self.history_top:
+            self.history_top = top
+            self.update_history_display()
+        return "break"
+    
+    def on_history_click(self, event):
+        row = int(self.history_text.index(f"@{event.x},{event.y}").split(".")[0]) - 1
+        if row < len(self.history_window):
+            self.current_input.set(self.history_window[row]["result"])
+        return "break"
+    
+    def save_history(self, expression, result):
         try:
-            with open("calculator_history.json", "w") as f:
-                json.dump(self.history, f)
-        except:
-            pass
+            return self.history_store.append(expression, result)
+        except OSError as exc:
+            self.report_history_error("save", exc)
+            return {"expression": expression, "result": result}
     
     def load_history(self):
-        if os.path.exists("calculator_history.json"):
+        try:
+            self.history = [format_entry(record) for record in self.history_store.recent()]
+        except OSError as exc:
+            self.history = []
+            self.report_history_error("load", exc)
+    
+    def report_history_error(self, action, exc):
+        if not self.history_error_shown:
+            self.history_error_shown = True
+            from tkinter import messagebox
+            messagebox.showwarning("History", f"Could not {action} history:\n{exc}")
+    
+    def open_plot(self):
+        from plot import PlotWindow
+        PlotWindow(self)
+    
+    def open_table(self):
+        from value_table import TableWindow
+        TableWindow(self)
+    
+    def open_solver(self):
+        from solver import SolverWindow
+        SolverWindow(self)
+    
+    def open_variables(self):
+        from sheet import VariablesWindow
+        if self.variables_window is not None and self.variables_window.winfo_exists():
+            self.variables_window.lift()
+        else:
+            self.variables_window = VariablesWindow(self)
+    
+    def open_statistics(self):
+        from dataset import StatisticsWindow
+        StatisticsWindow(self)
+    
+    def update_sheet(self, action, args, on_done, on_error=None):
+        # Calls self.sheet.action(*args) (None just follows the angle mode) in
+        # the sheet worker. on_done gets the names whose value changed, after
+        # self.sheet has been replaced by the updated copy; on_error gets the
+        # worker's error, e.g. "Timeout", and leaves the sheet as it was.
+        self.sheet_updates.append((action, args, on_done, on_error))
+        if not self.sheet_evaluator.busy:
+            self.next_sheet_update()
+    
+    def next_sheet_update(self):
+        if not self.sheet_updates:
+            return
+        action, args, on_done, on_error = self.sheet_updates[0]
+        
+        def done(outcome):
+            self.sheet_updates.popleft()
+            self.sheet, updated = outcome
+            self.refresh_variables()
+            on_done(updated)
+            self.next_sheet_update()
+        
+        def failed(error):
+            self.sheet_updates.popleft()
+            if on_error is not None:
+                on_error(error)
+            self.next_sheet_update()
+        
+        self.sheet_evaluator.submit(
+            (self.sheet, self.radians, action, args),
+            done,
+            failed,
+            function=update_sheet
+        )
+    
+    def refresh_variables(self):
+        if self.variables_window is not None and self.variables_window.winfo_exists():
+            self.variables_window.render()
+    
+    def toggle_timings(self):
+        from profiling import Instrumentation
+        if self.instrumentation is None:
+            self.instrumentation = Instrumentation(self)
+        if self.timings_enabled.get():
+            self.instrumentation.enable()
+        else:
+            self.instrumentation.disable()
+    
+    def open_timings(self):
+        from profiling import Instrumentation, TimingsWindow
+        if self.instrumentation is None:
+            self.instrumentation = Instrumentation(self)
+        TimingsWindow(self)
+    
+    def start_profile(self, kind):
+        if self.profiler is not None:
+            return
+        if kind == "cprofile":
+            import cProfile
+            self.profiler = cProfile.Profile()
+        else:
+            from profiling import SamplingProfiler
+            self.profiler = SamplingProfiler()
+        self.profiler.enable()
+    
+    def stop_profile(self):
+        from tkinter import filedialog, messagebox
+        if self.profiler is None:
+            return
+        profiler, self.profiler = self.profiler, None
+        profiler.disable()
+        # cProfile output is read with pstats or snakeviz, sampled stacks
+        # with flame graph tools
+        sampled = not hasattr(profiler, "print_stats")
+        path = filedialog.asksaveasfilename(
+            parent=self,
+            defaultextension=".folded" if sampled else ".prof",
+            filetypes=[("Folded stacks", "*.folded")] if sampled else [("cProfile output", "*.prof")]
+        )
+        if path:
             try:
-                with open("calculator_history.json", "r") as f:
-                    self.history = json.load(f)
-            except:
-                self.history = []
+                profiler.dump_stats(path)
+            except OSError as exc:
+                messagebox.showerror("Profile", str(exc), parent=self)
     
     def show_about(self):
+        from tkinter import messagebox
         messagebox.showinfo(
             "About",
             "Advanced Scientific Calculator\n\n"
@@ -361,6 +798,7 @@ class AdvancedCalculator(tk.Tk):
         )
     
     def show_help(self):
+        from tkinter import messagebox
         messagebox.showinfo(
             "Functions Help",
             "Available functions:\n\n"
@@ -377,6 +815,7 @@ class AdvancedCalculator(tk.Tk):
         )
     
     def on_button_click(self, button_text):
+        self.flush_typing()
         if button_text.isdigit() or button_text == ".":
             self.add_to_input(button_text)
         elif button_text in ["+", "-", "*", "/", "^", "%", "(", ")"]:
@@ -405,6 +844,7 @@ class AdvancedCalculator(tk.Tk):
             self.memory_subtract()
     
     def on_scientific_button(self, button_text):
+        self.flush_typing()
         try:
             current = self.current_input.get()
             
@@ -446,32 +886,105 @@ class AdvancedCalculator(tk.Tk):
         except:
             self.current_input.set("Error")
     
+    def type_text(self, text):
+        # Keystrokes are collected and shown once per idle cycle, so a burst
+        # of typing costs one display update rather than one per key
+        self.typed.append(text)
+        if self.typing_job is None:
+            self.typing_job = self.after_idle(self.flush_typing)
+    
+    def flush_typing(self):
+        # Called before anything that reads the input, so no keystroke is lost
+        if self.typing_job is not None:
+            self.after_cancel(self.typing_job)
+            self.typing_job = None
+        if self.typed:
+            current = self.current_input.get()
+            for text in self.typed:
+                current = joined_input(current, text)
+            self.typed = []
+            self.current_input.set(current)
+            self.schedule_preview()
+    
+    def paste(self):
+        try:
+            text = self.clipboard_get()
+        except tk.TclError:  # empty or non-text clipboard
+            return "break"
+        self.paste_text(text)
+        return "break"
+    
+    def paste_text(self, text):
+        # The whole expression is checked in one pass and shown with one update
+        try:
+            tokens = tokenize(text)
+        except EvaluationError:
+            self.bell()
+            return False
+        expression = ""
+        for token in tokens:
+            # Keep names and numbers that were apart from running together
+            if expression and (expression[-1].isalnum() or expression[-1] == ".") and (token[0].isalnum() or token[0] == "."):
+                expression += " "
+            expression += token
+        self.flush_typing()
+        if expression:
+            self.add_to_input(expression)
+        return True
+    
     def add_to_input(self, value):
-        current = self.current_input.get()
-        
-        if current == "0" and value != ".":
-            self.current_input.set(value)
-        else:
-            self.current_input.set(current + value)
+        self.current_input.set(joined_input(self.current_input.get(), value))
+        self.schedule_preview()
     
     def add_operator(self, operator):
         current = self.current_input.get()
         self.total_expression.set(self.total_expression.get() + current + operator)
         self.current_input.set("0")
+        self.schedule_preview()
+    
+    def schedule_preview(self):
+        # Debounced: only the last keystroke of a burst starts an evaluation,
+        # and a newer keystroke makes a running one stale
+        if self.preview_job is not None:
+            self.after_cancel(self.preview_job)
+        self.preview_evaluator.cancel()
+        self.preview_job = self.after(PREVIEW_DELAY, self.update_preview)
+    
+    def update_preview(self):
+        self.preview_job = None
+        if self.evaluator.busy:
+            return
+        self.preview_evaluator.submit(
+            (self.total_expression.get() + self.current_input.get(), self.radians),
+            lambda result: self.preview_text.set("= " + format_display(result)),
+            lambda error: self.preview_text.set(""),
+            function=preview_with
+        )
+    
+    def clear_preview(self):
+        if self.preview_job is not None:
+            self.after_cancel(self.preview_job)
+            self.preview_job = None
+        self.preview_evaluator.cancel()
+        self.preview_text.set("")
     
     def clear(self):
         self.current_input.set("0")
+        self.schedule_preview()
     
     def clear_all(self):
         self.current_input.set("0")
         self.total_expression.set("")
+        self.clear_preview()
     
     def backspace(self):
+        self.flush_typing()
         current = self.current_input.get()
         if len(current) == 1:
             self.current_input.set("0")
         else:
             self.current_input.set(current[:-1])
+        self.schedule_preview()
     
     def negate(self):
         current = self.current_input.get()
@@ -525,56 +1038,143 @@ class AdvancedCalculator(tk.Tk):
             pass
     
     def evaluate(self):
+        self.flush_typing()
+        if self.evaluator.busy or self.sheet_evaluator.busy:
+            return
+        
+        self.clear_preview()
+        self.pending_input = self.current_input.get()
+        expression = self.total_expression.get() + self.pending_input
+        assignment = parse_assignment(expression)
+        if assignment is not None:
+            self.assign_variable(*assignment)
+            return
+        
         try:
-            expression = self.total_expression.get() + self.current_input.get()
-            
-            # Replace special constants and functions
-            expression = expression.replace("^", "**")
-            expression = expression.replace("π", "pi")
-            expression = expression.replace("√", "sqrt")
-            
-            # Handle percentage
-            if "%" in expression:
-                parts = expression.split("%")
-                if len(parts) == 2:
-                    value = float(parts[0])
-                    percent = float(parts[1])
-                    result = value * percent / 100
-                    self.current_input.set(str(result))
-                    self.total_expression.set("")
-                    self.add_to_history(f"{value}% of {percent}", result)
-                    return
-            
-            result = eval(expression, {"__builtins__": None}, {
-                "sin": sin,
-                "cos": cos,
-                "tan": tan,
-                "asin": asin,
-                "acos": acos,
-                "atan": atan,
-                "log": log10,
-                "ln": log,
-                "sqrt": sqrt,
-                "pi": pi,
-                "e": e,
-                "radians": radians,
-                "degrees": degrees
-            })
-            
-            # Format result
-            if isinstance(result, float):
-                if result.is_integer():
-                    result = int(result)
-                else:
-                    # Round to 10 decimal places to avoid floating point weirdness
-                    result = round(result, 10)
-            
-            self.current_input.set(str(result))
-            self.add_to_history(expression, result)
+            variables = self.sheet.variables(expression)
+        except EvaluationError:
+            variables = None  # the worker reports the error
+        if variables and self.sheet.radians != self.radians:
+            # The recompute for a change of angle mode was cancelled; finish it first
+            self.current_input.set("Computing…")
+            self.update_sheet(None, (), lambda updated: self.retry_evaluate(), self.on_evaluation_failed)
+            return
+        
+        self.current_input.set("Computing…")
+        # Typed trigonometry follows the angle mode, as the sheet's formulas
+        # and the precision backends do
+        if self.precision is None:
+            self.evaluator.submit(
+                (expression, variables, self.radians),
+                self.on_evaluated,
+                self.on_evaluation_failed,
+                function=calculate_with
+            )
+        else:
+            from precision import calculate as precise_calculate
+            self.evaluator.submit(
+                (expression, self.precision, self.radians, variables),
+                self.on_evaluated,
+                self.on_evaluation_failed,
+                function=precise_calculate
+            )
+    
+    def retry_evaluate(self):
+        self.current_input.set(self.pending_input)
+        self.evaluate()
+    
+    def assign_variable(self, name, formula):
+        # The sheet worker recomputes only what the definition affects
+        self.current_input.set("Computing…")
+        
+        def done(updated):
+            if name in self.sheet.values:
+                result = format_display(format_result(self.sheet.values[name]))
+            else:
+                result = "Error"
+            self.current_input.set(result)
+            self.add_to_history(f"{name} = {self.sheet.formulas[name]}", result)
             self.total_expression.set("")
-        except:
+        
+        self.update_sheet("define", (name, formula), done, self.on_evaluation_failed)
+    
+    def on_evaluated(self, outcome):
+        expression, result, *cost = outcome
+        result = format_display(result)
+        self.current_input.set(result)
+        if cost:
+            # Arbitrary precision is priced per digit, so show what this one took
+            self.preview_text.set(f"{cost[0] * 1000:.1f} ms")
+        self.add_to_history(expression, result)
+        self.total_expression.set("")
+    
+    def on_evaluation_failed(self, error):
+        if error == "Timeout":
+            self.current_input.set("Timeout")
+        elif error.startswith("CostLimitError"):
+            self.current_input.set("Overflow")
+        else:
             self.current_input.set("Error")
+    
+    def cancel_or_clear(self):
+        self.flush_typing()
+        if self.evaluator.cancel():
+            # Give back the input that was being computed so it can be edited
+            self.current_input.set(self.pending_input)
+        elif self.sheet_evaluator.cancel():
+            # Drops every queued change to the variables, not just the running one
+            self.sheet_updates.clear()
+            self.current_input.set(self.pending_input)
+            self.refresh_variables()
+        else:
+            self.clear_all()
+    
+    def on_close(self):
+        self.evaluator.close()
+        self.sheet_evaluator.close()
+        self.preview_evaluator.close()
+        self.history_store.close()
+        self.destroy()
+
+def main(argv=None):
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Advanced Scientific Calculator")
+    parser.add_argument(
+        "--batch", nargs="?", const="-", metavar="FILE",
+        help="evaluate one expression per line from FILE (default: stdin) without the GUI"
+    )
+    parser.add_argument(
+        "--serve", nargs="?", const=0, type=int, metavar="PORT",
+        help="serve evaluation as JSON-RPC on localhost:PORT (default 8765) without the GUI"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="number of worker processes for --batch or --serve (0 = one per CPU)"
+    )
+    parser.add_argument(
+        "--chunksize", type=int,
+        help="lines sent to a worker at a time"
+    )
+    args = parser.parse_args(argv)
+
+    if args.serve is not None:
+        import server
+        server.run_server(args.serve or server.DEFAULT_PORT, args.workers)
+        return
+    
+    if args.batch is None:
+        app = AdvancedCalculator()
+        app.mainloop()
+        return
+    
+    import batch
+    chunksize = args.chunksize or batch.DEFAULT_CHUNKSIZE
+    if args.batch == "-":
+        batch.run_batch(sys.stdin, sys.stdout, args.workers, chunksize)
+    else:
+        with open(args.batch, "r") as f:
+            batch.run_batch(f, sys.stdout, args.workers, chunksize)
 
 if __name__ == "__main__":
-    app = AdvancedCalculator()
-    app.mainloop()
\ No newline at end of file
+    main()
\ No newline at end of file
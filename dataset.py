@@ -0,0 +1,354 @@
+import os
+import threading
+import tkinter as tk
+from itertools import islice
+
+from engine import load_numpy, format_result
+
+CHUNK = 1 << 20  # values summarized per step
+FINE_BINS = 1 << 16  # histogram resolution used for percentiles
+HISTOGRAM_BARS = 20
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+BINARY_TYPES = ("float64", "float32", "int64", "int32", "int16", "uint8")
+
+
+def require_numpy():
+    np = load_numpy()
+    if np is None:
+        raise ValueError("Statistics needs NumPy")
+    return np
+
+
+def csv_chunks(path, column=0, delimiter=",", chunksize=CHUNK):
+    # Streams one column of a text file as float arrays, a chunk of lines at a
+    # time. column is an index or a header name; a first line that is not
+    # numeric is taken as the header. Cells that are not numbers are skipped.
+    np = require_numpy()
+    with open(path, "r", newline="") as f:
+        first = f.readline()
+        cells = first.rstrip("\r\n").split(delimiter)
+        if isinstance(column, str) and not column.lstrip("-").isdigit():
+            names = [cell.strip().strip('"') for cell in cells]
+            if column not in names:
+                raise ValueError(f"No column named {column!r}")
+            column = names.index(column)
+            pending = []
+        else:
+            column = int(column)
+            pending = [first]
+        while True:
+            lines = pending + list(islice(f, chunksize - len(pending)))
+            pending = []
+            if not lines:
+                return
+            values = []
+            for line in lines:
+                cells = line.split(delimiter)
+                if column < len(cells):
+                    values.append(cells[column])
+            try:
+                array = np.array(values, dtype=float)
+            except ValueError:
+                array = np.array([float(value) for value in values if is_number(value)], dtype=float)
+            yield array
+
+
+def is_number(text):
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def binary_chunks(path, dtype="float64", column=0, chunksize=CHUNK):
+    # Memory-mapped, so the file is paged in by the OS as the chunks are
+    # read rather than loaded whole. .npy files carry their own type and
+    # shape; anything else is a flat array of dtype.
+    np = require_numpy()
+    if path.endswith(".npy"):
+        data = np.load(path, mmap_mode="r")
+        if data.ndim == 2:
+            column = int(column)
+            if not -data.shape[1] <= column < data.shape[1]:
+                raise ValueError(f"No column {column}: the array has {data.shape[1]} columns")
+            data = data[:, column]
+        elif data.ndim != 1:
+            raise ValueError("Only 1-D or 2-D arrays are supported")
+    elif os.path.getsize(path) == 0:
+        return
+    else:
+        data = np.memmap(path, dtype=dtype, mode="r")
+    for start in range(0, len(data), chunksize):
+        yield np.asarray(data[start:start + chunksize], dtype=float)
+
+
+def open_chunks(path, column=0, dtype="float64"):
+    # Returns a function producing a fresh chunk iterator, since the summary
+    # reads the data twice
+    if path.endswith((".csv", ".txt", ".tsv")):
+        delimiter = "\t" if path.endswith(".tsv") else ","
+        return lambda: csv_chunks(path, column, delimiter)
+    return lambda: binary_chunks(path, dtype, column)
+
+
+class Summary:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.percentiles = {}
+        self.histogram = []  # (low, high, count)
+        self.exact = False
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self):
+        return self.variance ** 0.5
+
+    def add(self, chunk):
+        # Chan et al.'s pairwise update: each chunk's moments are computed with
+        # NumPy and merged, which stays accurate where a running sum of
+        # squares would cancel.
+        np = require_numpy()
+        chunk = chunk[np.isfinite(chunk)]
+        n = len(chunk)
+        if not n:
+            return
+        chunk_sum = float(chunk.sum())
+        chunk_mean = chunk_sum / n
+        chunk_m2 = float(((chunk - chunk_mean) ** 2).sum())
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += chunk_m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.sum += chunk_sum
+        self.min = min(self.min, float(chunk.min()))
+        self.max = max(self.max, float(chunk.max()))
+
+    def items(self):
+        # (label, value) rows for display
+        rows = [
+            ("count", self.count),
+            ("sum", self.sum),
+            ("mean", self.mean),
+            ("variance", self.variance),
+            ("stdev", self.stdev),
+            ("min", self.min),
+            ("max", self.max),
+        ]
+        rows.extend((f"p{p}", value) for p, value in sorted(self.percentiles.items()))
+        return rows
+
+
+def summarize(chunks, progress=None):
+    # Two passes over the data with memory bounded by one chunk: moments,
+    # min and max first, then a fine histogram between min and max from
+    # which percentiles are interpolated (to within (max - min) / FINE_BINS)
+    # and the display histogram is taken. Data that fits in one chunk gets
+    # exact percentiles instead.
+    np = require_numpy()
+    summary = Summary()
+    read = []
+    for chunk in chunks():
+        summary.add(chunk)
+        # Only the first chunk is kept, and only while it is the only one
+        read = [chunk] if not read else [None]
+        if progress is not None:
+            progress(summary.count)
+    if not summary.count:
+        raise ValueError("No numbers found")
+
+    if read[0] is not None:
+        values = read[0][np.isfinite(read[0])]
+        summary.percentiles = dict(zip(PERCENTILES, np.percentile(values, PERCENTILES).tolist()))
+        summary.exact = True
+        counts, edges = np.histogram(values, bins=HISTOGRAM_BARS, range=(summary.min, summary.max))
+    else:
+        low, high = summary.min, summary.max
+        counts = np.zeros(FINE_BINS, dtype=np.int64)
+        scale = FINE_BINS / (high - low) if high > low else 0.0
+        for chunk in chunks():
+            chunk = chunk[np.isfinite(chunk)]
+            bins = np.minimum(((chunk - low) * scale).astype(np.int64), FINE_BINS - 1)
+            counts += np.bincount(bins, minlength=FINE_BINS)
+        cumulative = np.cumsum(counts)
+        width = (high - low) / FINE_BINS
+        for p in PERCENTILES:
+            rank = p / 100 * (summary.count - 1)
+            index = int(np.searchsorted(cumulative, rank, side="right"))
+            before = int(cumulative[index - 1]) if index else 0
+            inside = int(counts[index]) or 1
+            summary.percentiles[p] = low + width * (index + (rank - before + 0.5) / inside)
+        starts = np.arange(HISTOGRAM_BARS) * FINE_BINS // HISTOGRAM_BARS
+        counts = np.add.reduceat(counts, starts)
+        edges = np.append(low + starts * width, high)
+
+    summary.histogram = [
+        (float(edges[i]), float(edges[i + 1]), int(counts[i])) for i in range(len(counts))
+    ]
+    return summary
+
+
+class StatisticsWindow(tk.Toplevel):
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.title("Statistics")
+        self.geometry("520x560")
+
+        self.path = tk.StringVar(value="")
+        self.column = tk.StringVar(value="0")
+        self.dtype = tk.StringVar(value=BINARY_TYPES[0])
+        self.status = tk.StringVar(value="Choose a CSV or binary file")
+        self.summary = None
+        self.rows = []
+        self.selected = None
+        self.worker = None
+
+        form = app.register_widget("frame", tk.Frame(self))
+        form.pack(fill="x", padx=5, pady=5)
+        app.register_widget("button", tk.Button(
+            form,
+            text="Open…",
+            font=app.history_font,
+            relief="flat",
+            command=self.choose_file
+        )).grid(row=0, column=0, padx=2)
+        app.register_widget("history_input", tk.Entry(
+            form,
+            textvariable=self.path,
+            font=app.history_font,
+            relief="flat"
+        )).grid(row=0, column=1, columnspan=3, sticky="ew", padx=2)
+        app.register_widget("display", tk.Label(form, text="column", font=app.history_font)).grid(row=1, column=0)
+        app.register_widget("history_input", tk.Entry(
+            form,
+            textvariable=self.column,
+            font=app.history_font,
+            width=10,
+            relief="flat"
+        )).grid(row=1, column=1, sticky="w", padx=2)
+        app.register_widget("display", tk.Label(form, text="binary type", font=app.history_font)).grid(row=1, column=2)
+        tk.OptionMenu(form, self.dtype, *BINARY_TYPES).grid(row=1, column=3, sticky="w")
+        form.columnconfigure(1, weight=1)
+
+        buttons = app.register_widget("frame", tk.Frame(self))
+        buttons.pack(fill="x", padx=5)
+        for text, command in [
+            ("Summarize", self.start),
+            ("To Display", self.to_display),
+            ("To Memory", self.to_memory)
+        ]:
+            app.register_widget("button", tk.Button(
+                buttons,
+                text=text,
+                font=app.history_font,
+                relief="flat",
+                command=command
+            )).pack(side="left", padx=2, pady=2)
+        app.register_widget("display", tk.Label(
+            self,
+            textvariable=self.status,
+            font=app.history_font,
+            anchor="w"
+        )).pack(fill="x", padx=5)
+
+        self.text = app.register_widget("history", tk.Text(
+            self,
+            font=("Courier", 10),
+            state="disabled",
+            wrap="none",
+            cursor="hand2",
+            padx=5,
+            pady=5
+        ))
+        self.text.pack(fill="both", expand=True, padx=5, pady=5)
+        self.text.bind("<Button-1>", self.on_click)
+
+    def choose_file(self):
+        from tkinter import filedialog
+        path = filedialog.askopenfilename(
+            parent=self,
+            filetypes=[("Data files", "*.csv *.tsv *.txt *.npy *.bin *.dat"), ("All files", "*")]
+        )
+        if path:
+            self.path.set(path)
+            self.start()
+
+    def start(self):
+        if self.worker is not None or not self.path.get():
+            return
+        chunks = open_chunks(self.path.get(), self.column.get().strip() or "0", self.dtype.get())
+        # Read in a thread; progress and the result are picked up with after()
+        state = {"count": 0, "summary": None, "error": None}
+
+        def run():
+            try:
+                state["summary"] = summarize(chunks, progress=lambda count: state.update(count=count))
+            except Exception as exc:  # reported by poll(); the thread would die silently
+                state["error"] = exc
+
+        self.worker = threading.Thread(target=run, daemon=True)
+        self.worker.start()
+        self.poll(state)
+
+    def poll(self, state):
+        if self.worker.is_alive():
+            self.status.set(f"Reading… {state['count']:,} values")
+            self.after(100, self.poll, state)
+            return
+        self.worker = None
+        if state["error"] is not None:
+            self.status.set(str(state["error"]))
+            return
+        self.summary = state["summary"]
+        self.status.set(f"{self.summary.count:,} values" + ("" if self.summary.exact else ", percentiles binned"))
+        self.render()
+
+    def render(self):
+        self.rows = self.summary.items()
+        lines = [f"{label:10} {format_result(value)}" for label, value in self.rows]
+        lines.append("")
+        largest = max(count for low, high, count in self.summary.histogram) or 1
+        for low, high, count in self.summary.histogram:
+            lines.append(f"{low:12.4g} {'█' * round(30 * count / largest):30} {count:,}")
+        self.text.config(state="normal")
+        self.text.delete(1.0, "end")
+        self.text.insert("end", "\n".join(lines))
+        self.text.config(state="disabled")
+        self.select(2)  # mean
+
+    def select(self, row):
+        self.selected = row
+        self.text.tag_remove("sel", 1.0, "end")
+        self.text.tag_add("sel", f"{row + 1}.0", f"{row + 1}.end")
+
+    def on_click(self, event):
+        row = int(self.text.index(f"@{event.x},{event.y}").split(".")[0]) - 1
+        if 0 <= row < len(self.rows):
+            self.select(row)
+        return "break"
+
+    def selected_value(self):
+        if self.summary is None or self.selected is None:
+            return None
+        return format_result(self.rows[self.selected][1])
+
+    def to_display(self):
+        value = self.selected_value()
+        if value is not None:
+            self.app.current_input.set(str(value))
+
+    def to_memory(self):
+        value = self.selected_value()
+        if value is not None:
+            self.app.memory = value
+            self.app.update_memory_label()
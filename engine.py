@@ -0,0 +1,532 @@
+import ast
+import re
+from collections import OrderedDict
+from math import sin, cos, tan, asin, acos, atan, log10, log, log2, sqrt, pi, e, radians, degrees, floor, inf
+
+np = None
+numpy_checked = False
+
+# Functions and constants an expression may refer to, matching the names the
+# calculator has always exposed ("log" is base 10, "ln" is natural).
+FUNCTIONS = {
+    "sin": sin,
+    "cos": cos,
+    "tan": tan,
+    "asin": asin,
+    "acos": acos,
+    "atan": atan,
+    "log": log10,
+    "ln": log,
+    "sqrt": sqrt,
+    "radians": radians,
+    "degrees": degrees
+}
+
+CONSTANTS = {
+    "pi": pi,
+    "e": e
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub
+)
+
+DEFAULT_CACHE_SIZE = 4096
+PARTIALS_CACHE_SIZE = 256
+
+# Largest integer an expression may produce (about 1.26 million digits, 512 KB)
+MAX_INT_BITS = 1 << 22
+
+# Bound on quotient bits times divisor bits for integer // and %, which cost
+# that product in CPython (about 0.15 s at the limit)
+MAX_DIVISION_COST = 1 << 36
+
+# Integers longer than this are shown in scientific notation
+MAX_DISPLAY_DIGITS = 50
+
+
+class EvaluationError(ValueError):
+    pass
+
+
+class CostLimitError(EvaluationError):
+    pass
+
+
+def normalize(expression):
+    expression = expression.replace("^", "**")
+    expression = expression.replace("π", "pi")
+    expression = expression.replace("√", "sqrt")
+    return expression.strip()
+
+
+# Pasted text is checked token by token; anything else is rejected. Typographic
+# operators are mapped to the calculator's own.
+TOKEN = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)|([A-Za-z]\w*)|(\*\*|//|[-+*/^%()=π√×÷−]))")
+TYPOGRAPHIC = {"×": "*", "÷": "/", "−": "-"}
+
+
+def tokenize(text):
+    # One pass over the text; returns the tokens or raises EvaluationError at
+    # the first character that can't start one.
+    tokens = []
+    position = 0
+    root = None  # position of a √ waiting for its operand
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            position += len(text[position:]) - len(text[position:].lstrip())
+            raise EvaluationError(f"Unexpected {text[position]!r} at position {position + 1}")
+        number, name, operator = match.groups()
+        token = number or name or TYPOGRAPHIC.get(operator, operator)
+        if root is not None:
+            # √ stands for sqrt, which needs parentheses: √9 is sqrt(9)
+            if token == "(":
+                tokens.append("sqrt")
+            elif number or token == "π" or (name and name not in FUNCTIONS):
+                tokens.extend(("sqrt", "(", token, ")"))
+                root = None
+                position = match.end()
+                continue
+            else:
+                raise EvaluationError(f"Expected a number or '(' after '√' at position {root + 1}")
+            root = None
+        if token == "√":
+            root = match.end() - 1
+        else:
+            tokens.append(token)
+        position = match.end()
+    if root is not None:
+        raise EvaluationError(f"Expected a number or '(' after '√' at position {root + 1}")
+    return tokens
+
+
+def format_result(result):
+    if isinstance(result, float):
+        if result.is_integer():
+            return int(result)
+        # Round to 10 decimal places to avoid floating point weirdness
+        return round(result, 10)
+    return result
+
+
+def split_terms(expression):
+    # Split at top-level + and - into (sign, term) pairs, so that a + b - c can
+    # be evaluated as ((a + b) - c) one term at a time. A sign directly after
+    # an operator or an opening parenthesis is unary and stays in its term.
+    terms = []
+    depth = 0
+    start = 0
+    sign = ""
+    previous = ""
+    for i, char in enumerate(expression):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char in "+-" and depth == 0 and previous and (previous.isalnum() or previous in ")._"):
+            terms.append((sign, expression[start:i]))
+            sign = char
+            start = i + 1
+        if not char.isspace():
+            previous = char
+    terms.append((sign, expression[start:]))
+    return terms
+
+
+def format_display(result, max_digits=MAX_DISPLAY_DIGITS):
+    # str() of a huge int is quadratic and refused past sys.get_int_max_str_digits(),
+    # so long integers are shown as mantissa and exponent worked out from the bits.
+    if not isinstance(result, int) or result.bit_length() <= max_digits * 3.32:
+        return str(result)
+
+    sign = "-" if result < 0 else ""
+    result = abs(result)
+    shift = max(result.bit_length() - 64, 0)
+    exponent10 = log10(result >> shift) + shift * log10(2)
+    exponent = floor(exponent10)
+    if exponent <= max_digits and len(str(result)) <= max_digits:
+        return sign + str(result)
+    mantissa = round(10 ** (exponent10 - exponent), 10)
+    if mantissa >= 10:
+        mantissa /= 10
+        exponent += 1
+    return f"{sign}{mantissa}e+{exponent}"
+
+
+def estimate_bits(node, names=None):
+    # Upper bound on log2 of the magnitude of an integer-valued subtree, or None
+    # when the subtree produces a float (floats overflow cheaply on their own).
+    # names gives the bound for variables known to hold integers.
+    if isinstance(node, ast.Expression):
+        return estimate_bits(node.body, names)
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, int):
+            return log2(abs(node.value)) if node.value else 0.0
+        return None
+    if isinstance(node, ast.Name):
+        return names.get(node.id) if names else None
+    if isinstance(node, ast.UnaryOp):
+        return estimate_bits(node.operand, names)
+    if not isinstance(node, ast.BinOp):
+        return None
+
+    left = estimate_bits(node.left, names)
+    right = estimate_bits(node.right, names)
+    if left is None or right is None or isinstance(node.op, ast.Div):
+        return None
+    if isinstance(node.op, (ast.Add, ast.Sub)):
+        return max(left, right) + 1
+    if isinstance(node.op, ast.Mult):
+        return left + right
+    if isinstance(node.op, ast.FloorDiv):
+        return left
+    if isinstance(node.op, ast.Mod):
+        return right
+    # ast.Pow: |a ** b| <= 2 ** (left * 2 ** right)
+    if is_negative_constant(node.right):
+        return None  # a float, however large the exponent
+    if left == 0:
+        return 0.0
+    if right > 1024:
+        return inf
+    return left * 2 ** right
+
+
+def is_negative_constant(node):
+    # True for -5, -(-(-5)) and the like
+    negative = False
+    while isinstance(node, ast.UnaryOp):
+        if isinstance(node.op, ast.USub):
+            negative = not negative
+        node = node.operand
+    return isinstance(node, ast.Constant) and negative and node.value != 0
+
+
+def integer_bits(variables):
+    return {
+        name: log2(abs(value)) if value else 0.0
+        for name, value in variables.items()
+        if isinstance(value, int) and not isinstance(value, bool)
+    }
+
+
+def division_cost(node, names=None):
+    # Upper bound on quotient bits times divisor bits of an integer // or %,
+    # or None when either side is a float. With the divisor's size only
+    # bounded by right, the worst case is a divisor of half the dividend.
+    left = estimate_bits(node.left, names)
+    right = estimate_bits(node.right, names)
+    if left is None or right is None or left == inf:
+        return None  # a float, or an operand the size check refuses anyway
+    divisor = min(right, left / 2)
+    return (left - divisor) * divisor
+
+
+def check_cost(tree, max_bits=MAX_INT_BITS, names=None, max_division_cost=MAX_DIVISION_COST):
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.BinOp):
+            continue
+        if isinstance(node.op, (ast.Pow, ast.Mult)):
+            bits = estimate_bits(node, names)
+            if bits is not None and bits > max_bits:
+                if bits == inf:
+                    raise CostLimitError("Result too large")
+                raise CostLimitError(f"Result too large: about {bits * 0.30103:.3g} digits")
+        elif isinstance(node.op, (ast.FloorDiv, ast.Mod)):
+            cost = division_cost(node, names)
+            if cost is not None and cost > max_division_cost:
+                raise CostLimitError("Division too slow: both numbers are too long")
+
+
+def validate(tree):
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise EvaluationError(f"Unsupported syntax: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and (
+            isinstance(node.value, bool) or not isinstance(node.value, (int, float))
+        ):
+            raise EvaluationError(f"Unsupported constant: {node.value!r}")
+        if isinstance(node, ast.Name) and node.id.startswith("_"):
+            raise EvaluationError(f"Unsupported name: {node.id}")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                raise EvaluationError("Only calculator functions can be called")
+            if node.keywords or len(node.args) != 1:
+                raise EvaluationError(f"{node.func.id}() takes exactly one argument")
+
+
+class CompiledExpression:
+    __slots__ = ("source", "tree", "code", "names")
+
+    def __init__(self, source, tree, code):
+        self.source = source
+        self.tree = tree
+        self.code = code
+        self.names = frozenset(
+            node.id for node in ast.walk(tree)
+            if isinstance(node, ast.Name)
+            and node.id not in FUNCTIONS and node.id not in CONSTANTS
+        )
+
+    def __call__(self, variables=None, namespace=None):
+        if namespace is None:
+            namespace = NAMESPACE
+        if variables:
+            namespace = dict(namespace, **variables)
+        return eval(self.code, namespace)
+
+
+def compile_expression(expression):
+    source = normalize(expression)
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as exc:
+        raise EvaluationError(f"Invalid expression: {expression!r}") from exc
+    validate(tree)
+    check_cost(tree)
+    return CompiledExpression(source, tree, compile(tree, "<expression>", "eval"))
+
+
+def load_numpy():
+    # NumPy is imported on first vectorized evaluation rather than with the module,
+    # so starting the calculator doesn't pay for it.
+    global np, numpy_checked
+    if not numpy_checked:
+        numpy_checked = True
+        try:
+            import numpy
+        except ImportError:  # vectorized evaluation falls back to a per-element loop
+            numpy = None
+        np = numpy
+    return np
+
+
+def as_floats(values):
+    # evaluate_array() results as a list of Python floats, with or without NumPy
+    return values.tolist() if hasattr(values, "tolist") else [float(value) for value in values]
+
+
+def degree_functions(functions, to_radians, to_degrees):
+    functions = dict(functions)
+    for name in ("sin", "cos", "tan"):
+        functions[name] = lambda value, f=functions[name]: f(to_radians(value))
+    for name in ("asin", "acos", "atan"):
+        functions[name] = lambda value, f=functions[name]: to_degrees(f(value))
+    return functions
+
+
+def vector_functions():
+    return {
+        "sin": np.sin,
+        "cos": np.cos,
+        "tan": np.tan,
+        "asin": np.arcsin,
+        "acos": np.arccos,
+        "atan": np.arctan,
+        "log": np.log10,
+        "ln": np.log,
+        "sqrt": np.sqrt,
+        "radians": np.radians,
+        "degrees": np.degrees
+    }
+
+
+NAMESPACE = {"__builtins__": {}, **FUNCTIONS, **CONSTANTS}
+
+_namespaces = {(True, False): NAMESPACE}
+
+
+def namespace(radians=True, vector=False):
+    key = (radians, vector)
+    if key not in _namespaces:
+        if vector:
+            functions = vector_functions()
+            if not radians:
+                functions = degree_functions(functions, np.radians, np.degrees)
+        else:
+            functions = degree_functions(FUNCTIONS, FUNCTIONS["radians"], FUNCTIONS["degrees"])
+        _namespaces[key] = {"__builtins__": {}, **functions, **CONSTANTS}
+    return _namespaces[key]
+
+
+class Engine:
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.partials = OrderedDict()  # running totals of evaluated expression prefixes
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, expression):
+        key = normalize(expression)
+        compiled = self.cache.get(key)
+        if compiled is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return compiled
+
+        self.misses += 1
+        compiled = compile_expression(key)
+        self.cache[key] = compiled
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return compiled
+
+    def compile_function(self, expression, variables=("x",)):
+        # compile() for a function of the given variables, such as f(x) for
+        # plots, tables and the solver; any other name is an error up front
+        # rather than a NameError at the first evaluation.
+        compiled = self.compile(expression)
+        unknown = compiled.names - set(variables)
+        if unknown:
+            raise EvaluationError(f"Unknown name: {', '.join(sorted(unknown))}")
+        return compiled
+
+    def evaluate(self, expression, variables=None, radians=True):
+        compiled = self.compile(expression)
+        if variables:
+            bits = integer_bits(variables)
+            if bits:
+                check_cost(compiled.tree, names=bits)
+        return compiled(variables, namespace(radians))
+
+    def evaluate_incremental(self, expression, radians=True):
+        # For expressions typed left to right. The running total of every
+        # complete leading term is cached under its source text, so when only
+        # the last term changes, only that term is parsed and evaluated.
+        expression = normalize(expression)
+        terms = split_terms(expression)
+        try:
+            total = None
+            prefix = ""
+            for sign, term in terms:
+                prefix += sign + term
+                key = (prefix, radians)
+                if key in self.partials:
+                    total = self.partials[key]
+                    self.partials.move_to_end(key)
+                    continue
+                value = self.evaluate(term, radians=radians)
+                if total is None:
+                    total = value
+                else:
+                    total = total + value if sign == "+" else total - value
+                self.partials[key] = total
+                if len(self.partials) > PARTIALS_CACHE_SIZE:
+                    self.partials.popitem(last=False)
+            return total
+        except EvaluationError:
+            # e.g. "1e-5", which only parses as a whole
+            return self.evaluate(expression, radians=radians)
+
+    def evaluate_array(self, expression, variables=None, radians=True):
+        # Evaluate one expression element-wise over arrays bound to variable
+        # names, e.g. evaluate_array("sin(x)^2", {"x": xs}). Returns an ndarray,
+        # or a list of floats when NumPy is not installed.
+        compiled = self.compile(expression)
+        variables = variables or {}
+        if load_numpy() is None:
+            return self._evaluate_elementwise(compiled, variables, radians)
+
+        arrays = {name: np.asarray(value, dtype=float) for name, value in variables.items()}
+        shape = np.broadcast_shapes(*(array.shape for array in arrays.values()))
+        try:
+            with np.errstate(all="ignore"):
+                result = np.asarray(compiled(arrays, namespace(radians, vector=True)), dtype=float)
+        except (OverflowError, TypeError):
+            # An integer beyond float range, e.g. x + 10^400, which NumPy cannot
+            # take; math can, point by point, and what still overflows is nan
+            flat = {name: np.broadcast_to(array, shape).ravel().tolist() for name, array in arrays.items()}
+            return np.array(self._evaluate_elementwise(compiled, flat, radians), dtype=float).reshape(shape)
+        if result.shape != shape:
+            result = np.array(np.broadcast_to(result, shape))
+        return result
+
+    def _evaluate_elementwise(self, compiled, variables, radians):
+        columns = {}
+        length = 1
+        for name, value in variables.items():
+            if isinstance(value, (int, float)):
+                columns[name] = None
+            else:
+                columns[name] = value = list(value)
+                length = len(value) if length == 1 else length
+                if len(value) not in (1, length):
+                    raise ValueError(f"Cannot broadcast {name!r} to length {length}")
+
+        scalar_namespace = namespace(radians)
+        results = []
+        for i in range(length):
+            row = {
+                name: variables[name] if column is None else column[i if len(column) > 1 else 0]
+                for name, column in columns.items()
+            }
+            try:
+                results.append(float(compiled(row, scalar_namespace)))
+            except (ValueError, ZeroDivisionError, OverflowError, TypeError):
+                results.append(float("nan"))
+        return results
+
+    def calculate(self, expression, variables=None, radians=True):
+        # Same semantics as the calculator's "=" key. Returns the text recorded
+        # in history together with the result shown on the display.
+        expression = normalize(expression)
+
+        # Handle percentage
+        if "%" in expression:
+            parts = expression.split("%")
+            if len(parts) == 2:
+                value = float(parts[0])
+                percent = float(parts[1])
+                return f"{value}% of {percent}", value * percent / 100
+
+        return expression, format_result(self.evaluate(expression, variables, radians))
+
+    def cache_info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.cache),
+            "maxsize": self.cache_size
+        }
+
+    def clear_cache(self):
+        self.cache.clear()
+        self.partials.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+default_engine = Engine()
+
+
+# Module-level entry points, picklable for worker processes
+
+
+def calculate(expression):
+    return default_engine.calculate(expression)
+
+
+def calculate_with(arguments):
+    # calculate() with named variables and an angle mode:
+    # (expression, {name: value} or None, radians)
+    expression, variables, radians = arguments
+    return default_engine.calculate(expression, variables, radians)
+
+
+def preview(expression, radians=True):
+    # Tentative result of a partly typed expression
+    expression = normalize(expression)
+    if "%" in expression:
+        return default_engine.calculate(expression)[1]
+    return format_result(default_engine.evaluate_incremental(expression, radians))
+
+
+def preview_with(arguments):
+    # preview() in an angle mode: (expression, radians)
+    expression, radians = arguments
+    return preview(expression, radians)
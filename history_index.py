@@ -0,0 +1,138 @@
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+
+TOKEN = re.compile(r"[A-Za-z_]+|\d+(?:\.\d+)?")
+NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+BETWEEN = re.compile(rf"^(?:results?\s+)?between\s+({NUMBER})\s+and\s+({NUMBER})$", re.IGNORECASE)
+RANGE = re.compile(rf"^({NUMBER})\s*\.\.\s*({NUMBER})$")
+COMPARISON = re.compile(rf"^(?:results?\s*)?(<=|>=|<|>|=)\s*({NUMBER})$", re.IGNORECASE)
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class HistoryIndex:
+    # In-memory search index over history records. Expression text is indexed
+    # by trigrams (substring queries) and by sorted tokens (short prefix
+    # queries), numeric results by a sorted list for range queries. Records
+    # are identified by the order they were added, so newer records have
+    # larger ids.
+
+    def __init__(self, records=()):
+        self.records = []
+        self.grams = defaultdict(list)
+        self.postings = defaultdict(list)
+        self.tokens = []
+        self.values = []  # sorted (value, id) pairs
+        self.extend(records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, record):
+        record_id, value = self.index(record, sort_tokens=True)
+        if value is not None:
+            insort(self.values, (value, record_id))
+        return record_id
+
+    def extend(self, records):
+        # Bulk load: sort the numeric index and the tokens once instead of
+        # inserting each value
+        for record in records:
+            record_id, value = self.index(record)
+            if value is not None:
+                self.values.append((value, record_id))
+        self.values.sort()
+        self.tokens = sorted(self.postings)
+
+    def index(self, record, sort_tokens=False):
+        # sort_tokens keeps self.tokens sorted as new tokens appear; a bulk
+        # load sorts them at the end instead
+        record_id = len(self.records)
+        self.records.append(record)
+
+        text = record["expression"].lower()
+        for gram in trigrams(text):
+            self.grams[gram].append(record_id)
+        for token in set(TOKEN.findall(text)):
+            if sort_tokens and token not in self.postings:
+                insort(self.tokens, token)
+            self.postings[token].append(record_id)
+
+        try:
+            value = float(record["result"])
+        except (TypeError, ValueError):
+            return record_id, None
+        # NaN has no place in a sorted index
+        return record_id, value if value == value else None
+
+    def search(self, query):
+        # Returns matching record ids, newest first
+        query = query.strip()
+        if not query:
+            return []
+
+        match = BETWEEN.match(query) or RANGE.match(query)
+        if match:
+            low, high = sorted(float(group) for group in match.groups())
+            return self.between(low, high)
+        match = COMPARISON.match(query)
+        if match:
+            operator, value = match.group(1), float(match.group(2))
+            if operator == "=":
+                return self.between(value, value)
+            if operator in ("<", "<="):
+                return self.between(float("-inf"), value, include_high=operator == "<=")
+            return self.between(value, float("inf"), include_low=operator == ">=")
+
+        return self.contains(query.lower())
+
+    def between(self, low, high, include_low=True, include_high=True):
+        if include_low:
+            start = bisect_left(self.values, (low, -1))
+        else:
+            start = bisect_right(self.values, (low, len(self.records)))
+        if include_high:
+            stop = bisect_right(self.values, (high, len(self.records)))
+        else:
+            stop = bisect_left(self.values, (high, -1))
+        return sorted((record_id for _, record_id in self.values[start:stop]), reverse=True)
+
+    def contains(self, text):
+        if len(text) < 3:
+            if TOKEN.fullmatch(text):
+                return self.prefix(text)
+            # One or two operator characters match most of the history anyway
+            return [
+                record_id for record_id in range(len(self.records) - 1, -1, -1)
+                if text in self.records[record_id]["expression"]
+            ]
+
+        postings = []
+        for gram in trigrams(text):
+            if gram not in self.grams:
+                return []
+            postings.append(self.grams[gram])
+        postings.sort(key=len)
+
+        candidates = set(postings[0])
+        for other in postings[1:]:
+            candidates.intersection_update(other)
+            if not candidates:
+                return []
+        # Trigrams can match out of order, so confirm the substring
+        return sorted(
+            (record_id for record_id in candidates if text in self.records[record_id]["expression"].lower()),
+            reverse=True
+        )
+
+    def prefix(self, text):
+        matches = set()
+        for i in range(bisect_left(self.tokens, text), len(self.tokens)):
+            token = self.tokens[i]
+            if not token.startswith(text):
+                break
+            matches.update(self.postings[token])
+        return sorted(matches, reverse=True)
@@ -0,0 +1,368 @@
+import json
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends stay atomic, but compaction is not coordinated
+    fcntl = None
+
+HISTORY_FILE = "calculator_history.jsonl"
+LEGACY_HISTORY_FILE = "calculator_history.json"
+DEFAULT_CAPACITY = 10000
+DEFAULT_PAGE_SIZE = 50
+
+# Let the log grow this much past capacity before compacting it
+COMPACT_SLACK = 0.5
+READ_BLOCK = 64 * 1024
+
+# Inode recorded when the log did not exist yet: all of it is new when it appears
+ABSENT = -1
+
+
+def default_history_path():
+    # One history shared by every calculator of the user, wherever it was
+    # started; CALCULATOR_HISTORY points it elsewhere.
+    path = os.environ.get("CALCULATOR_HISTORY")
+    if path:
+        return path
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "calculator", HISTORY_FILE)
+
+
+def format_entry(record):
+    return f"{record['expression']} = {record['result']}"
+
+
+def parse_entry(entry, timestamp=None):
+    expression, _, result = entry.rpartition(" = ")
+    return {"time": timestamp, "expression": expression, "result": result}
+
+
+def encode(record):
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def decode(line):
+    # A crash can leave a partial last line; such lines are skipped.
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict) or "expression" not in record or "result" not in record:
+        return None
+    return record
+
+
+class HistoryStore:
+    # Append-only JSON Lines log, one record per evaluation. Appends are a
+    # single write() on an O_APPEND descriptor, so they cost O(1) no matter
+    # how long the history is. When the log outgrows its capacity it is
+    # rewritten in a background thread to a temporary file that atomically
+    # replaces the log.
+    #
+    # Several calculators can share the log. Appends and rewrites hold an
+    # advisory lock on a side file (the log itself is replaced by rewrites),
+    # and each store remembers how much of the log it has seen, so records
+    # written by other processes are picked up incrementally by changes().
+
+    def __init__(self, path=None, capacity=DEFAULT_CAPACITY, page_size=DEFAULT_PAGE_SIZE):
+        self.path = path or default_history_path()
+        self.capacity = capacity
+        self.page_size = page_size
+        self.lock = threading.Lock()
+        self.lock_fd = None
+        self.fd = None
+        self.offsets = None  # file offset of every record, built by the first compaction pass
+        self.indexed_size = 0  # bytes of the log covered by offsets
+        self.compactor = None
+
+        # What this store has seen of the log: its inode and how many bytes
+        self.inode = None
+        self.known_size = 0
+        self.pending = []  # records from other processes not yet returned by changes()
+        self.replaced = False
+
+        if not os.path.exists(self.path):
+            self.import_legacy()
+
+    def import_legacy(self):
+        # History used to be kept in the working directory
+        if os.path.exists(HISTORY_FILE) and os.path.abspath(HISTORY_FILE) != os.path.abspath(self.path):
+            try:
+                with open(HISTORY_FILE, "rb") as f:
+                    data = f.read()
+            except OSError:
+                return
+        elif os.path.exists(LEGACY_HISTORY_FILE):
+            try:
+                with open(LEGACY_HISTORY_FILE, "r") as f:
+                    entries = json.load(f)
+                timestamp = os.path.getmtime(LEGACY_HISTORY_FILE)
+            except (OSError, ValueError):
+                return
+            records = [parse_entry(entry, timestamp) for entry in entries if isinstance(entry, str)]
+            data = b"".join(encode(record) for record in records)
+        else:
+            return
+        try:
+            with self.locked():
+                if not os.path.exists(self.path):
+                    self.write_atomically(data)
+        except OSError:
+            pass  # e.g. an unwritable data directory; reported on first append
+
+    @contextmanager
+    def locked(self):
+        # The thread lock orders this process's threads, the file lock other processes
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            if self.lock_fd is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self.lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+
+    def open(self):
+        if self.fd is not None and os.fstat(self.fd).st_ino != self.inode and self.inode is not None:
+            # Replaced by another process's compaction
+            os.close(self.fd)
+            self.fd = None
+        if self.fd is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            flags = os.O_RDWR | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0)  # no newline translation on Windows
+            self.fd = os.open(self.path, flags, 0o644)
+            # Terminate a line left unfinished by a crash so the next record stays intact
+            size = os.fstat(self.fd).st_size
+            if size:
+                # lseek and read rather than pread, which Windows lacks
+                os.lseek(self.fd, size - 1, os.SEEK_SET)
+                if os.read(self.fd, 1) != b"\n":
+                    os.write(self.fd, b"\n")
+        return self.fd
+
+    def close(self):
+        if self.compactor is not None:
+            self.compactor.join()
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+            if self.lock_fd is not None:
+                os.close(self.lock_fd)
+                self.lock_fd = None
+
+    @property
+    def count(self):
+        # Records on disk, or None until the background pass has indexed the log
+        offsets = self.offsets
+        return None if offsets is None else len(offsets)
+
+    def append(self, expression, result):
+        record = {"time": time.time(), "expression": expression, "result": str(result)}
+        data = encode(record)
+        with self.locked():
+            self.read_new()
+            fd = self.open()
+            position = os.fstat(fd).st_size
+            os.write(fd, data)
+            if self.offsets is not None:
+                self.offsets.append(position)
+                self.indexed_size = position + len(data)
+            self.inode = os.fstat(fd).st_ino
+            self.known_size = position + len(data)
+        self.maybe_compact()
+        return record
+
+    def read_new(self):
+        # Under the lock: collect records other processes appended since this
+        # store last looked, or notice that the log was replaced.
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if self.inode is None:
+            self.inode, self.known_size = stat.st_ino, stat.st_size
+            return
+        if self.inode == ABSENT:
+            self.inode = stat.st_ino
+        if stat.st_ino != self.inode or stat.st_size < self.known_size:
+            # Compacted by another process; offsets into the old file are useless
+            self.inode, self.known_size = stat.st_ino, stat.st_size
+            self.offsets = None
+            self.indexed_size = 0
+            self.pending = []
+            self.replaced = True
+            return
+        if stat.st_size == self.known_size:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self.known_size)
+            data = f.read(stat.st_size - self.known_size)
+        position = self.known_size
+        for line in data[:data.rfind(b"\n") + 1].split(b"\n")[:-1]:
+            record = decode(line)
+            if record is not None:
+                self.pending.append(record)
+                if self.offsets is not None and position >= self.indexed_size:
+                    self.offsets.append(position)
+                    self.indexed_size = position + len(line) + 1
+            position += len(line) + 1
+        self.known_size = position
+
+    def changes(self):
+        # Records appended by other processes since the last call, oldest
+        # first, or None if the log was replaced and has to be read again.
+        # Costs one stat() when nothing happened.
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if stat.st_ino == self.inode and stat.st_size == self.known_size and not self.pending and not self.replaced:
+            return []
+        with self.locked():
+            self.read_new()
+            if self.replaced:
+                self.replaced = False
+                return None
+            records, self.pending = self.pending, []
+        return records
+
+    def records(self):
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                record = decode(line)
+                if record is not None:
+                    yield record
+
+    def newest(self, start, count):
+        # Random access for the history panel: records newest first, with
+        # start=0 being the latest evaluation.
+        if self.offsets is None:
+            return list(reversed(self.recent(start + count)))[start:]
+
+        records = []
+        with self.lock, open(self.path, "rb") as f:
+            last = len(self.offsets) - 1 - start
+            for i in range(last, max(last - count, -1), -1):
+                f.seek(self.offsets[i])
+                records.append(decode(f.readline()) or parse_entry(""))
+        return records
+
+    def recent(self, count=None):
+        # Read backwards from the end of the log until enough records are found,
+        # so startup cost depends on the page size rather than the history size.
+        count = self.page_size if count is None else count
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            if self.inode is None:
+                self.inode, self.known_size = ABSENT, 0
+            return []
+
+        with f:
+            position = f.seek(0, os.SEEK_END)
+            if self.inode is None:
+                # Records after this point are new to this store
+                self.inode, self.known_size = os.fstat(f.fileno()).st_ino, position
+            buffer = b""
+            while position > 0 and buffer.count(b"\n") <= count:
+                step = min(READ_BLOCK, position)
+                position -= step
+                f.seek(position)
+                buffer = f.read(step) + buffer
+
+        lines = buffer.split(b"\n")
+        if position > 0:
+            lines = lines[1:]  # first line may be cut in half
+        records = [record for record in map(decode, lines) if record is not None]
+        return records[-count:] if count else []
+
+    def maybe_compact(self):
+        if self.compactor is not None and self.compactor.is_alive():
+            return
+        if self.count is None or self.count > self.capacity * (1 + COMPACT_SLACK):
+            self.compactor = threading.Thread(target=self.compact, daemon=True)
+            self.compactor.start()
+
+    def compact(self):
+        try:
+            with self.locked():
+                # Appends happen under the lock, so this size ends on a record boundary
+                stat = os.stat(self.path)
+                size, inode = stat.st_size, stat.st_ino
+            kept = deque(maxlen=self.capacity)
+            offsets = array("q")
+            position = 0
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if position + len(line) > size:
+                        break
+                    if decode(line) is not None:
+                        kept.append(line if line.endswith(b"\n") else line + b"\n")
+                        offsets.append(position)
+                    position += len(line)
+        except FileNotFoundError:
+            self.offsets = array("q")
+            return
+
+        with self.locked():
+            self.read_new()
+            if self.inode != inode:
+                return  # replaced by another process meanwhile; indexed again later
+
+            # Records appended while the snapshot was being read
+            with open(self.path, "rb") as f:
+                f.seek(size)
+                tail = f.read()
+            lines = tail.split(b"\n")[:-1]
+
+            if len(offsets) > self.capacity:
+                kept.extend(line + b"\n" for line in lines if decode(line) is not None)
+                self.write_atomically(b"".join(kept))
+                if self.fd is not None:
+                    os.close(self.fd)
+                    self.fd = None
+                offsets = array("q")
+                position = 0
+                for line in kept:
+                    offsets.append(position)
+                    position += len(line)
+                self.inode, self.known_size = os.stat(self.path).st_ino, position
+            else:
+                position = size
+                for line in lines:
+                    if decode(line) is not None:
+                        offsets.append(position)
+                    position += len(line) + 1
+            self.offsets = offsets
+            self.indexed_size = position
+
+    def write_atomically(self, data):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
@@ -0,0 +1,232 @@
+import tkinter as tk
+from collections import OrderedDict
+from math import floor, ceil, log2, isfinite
+
+from engine import default_engine, EvaluationError, as_floats
+
+CHUNK = 256  # samples evaluated per batch
+MAX_CHUNKS = 512  # cached sample chunks per function
+MAX_DEPTH = 6  # rounds of adaptive subdivision
+CURVE_TOLERANCE = 1.5  # pixels of deviation from a straight segment before refining
+MAX_REFINED = 4096  # extra samples per redraw
+
+
+class FunctionSampler:
+    # Samples y = f(x) on grids of spacing 2**level. Samples are cached in
+    # chunks keyed by (level, chunk index), so panning only evaluates chunks
+    # that scroll into view, and a coarser level is taken from a cached finer
+    # one when zooming out.
+
+    def __init__(self, expression, radians=True, engine=default_engine):
+        self.expression = expression
+        self.radians = radians
+        self.engine = engine
+        self.engine.compile_function(expression)  # raises EvaluationError early
+        self.chunks = OrderedDict()
+        self.evaluations = 0
+
+    def evaluate(self, xs):
+        self.evaluations += len(xs)
+        values = self.engine.evaluate_array(self.expression, {"x": xs}, self.radians)
+        return as_floats(values)
+
+    def chunk(self, level, index):
+        key = (level, index)
+        ys = self.chunks.get(key)
+        if ys is not None:
+            self.chunks.move_to_end(key)
+            return ys
+
+        left = self.chunks.get((level - 1, 2 * index))
+        right = self.chunks.get((level - 1, 2 * index + 1))
+        if left is not None and right is not None:
+            ys = left[::2] + right[::2]
+        else:
+            step = 2.0 ** level
+            ys = self.evaluate([(index * CHUNK + i) * step for i in range(CHUNK)])
+
+        self.chunks[key] = ys
+        if len(self.chunks) > MAX_CHUNKS:
+            self.chunks.popitem(last=False)
+        return ys
+
+    def samples(self, x_min, x_max, pixels):
+        level = floor(log2(max((x_max - x_min) / max(pixels, 1), 1e-300)))
+        step = 2.0 ** level
+        first = floor(x_min / step) - 1
+        last = ceil(x_max / step) + 1
+
+        xs = []
+        ys = []
+        for index in range(first // CHUNK, last // CHUNK + 1):
+            chunk = self.chunk(level, index)
+            start = max(first - index * CHUNK, 0)
+            stop = min(last - index * CHUNK + 1, CHUNK)
+            xs.extend((index * CHUNK + i) * step for i in range(start, stop))
+            ys.extend(chunk[start:stop])
+        return xs, ys
+
+    def refine(self, xs, ys, y_scale, jump):
+        # Subdivide intervals where the curve bends by more than the tolerance
+        # or jumps by more than `jump` pixels, evaluating every round's new
+        # midpoints in one batch. Returns polylines, split at gaps and at jumps
+        # that do not shrink under subdivision (asymptotes such as tan's).
+        budget = MAX_REFINED
+        for depth in range(MAX_DEPTH):
+            marked = set()
+            for i in range(len(xs) - 1):
+                a, b = ys[i], ys[i + 1]
+                if isfinite(a) != isfinite(b):
+                    marked.add(i)
+                elif isfinite(a) and abs(b - a) * y_scale > jump:
+                    marked.add(i)
+                elif 0 < i and isfinite(a) and isfinite(b) and isfinite(ys[i - 1]):
+                    bend = abs(ys[i - 1] - 2 * a + b) * y_scale
+                    if bend > CURVE_TOLERANCE:
+                        marked.update((i - 1, i))
+            marked = sorted(marked)[:budget]
+            if not marked:
+                break
+            budget -= len(marked)
+
+            middles = [(xs[i] + xs[i + 1]) / 2 for i in marked]
+            values = self.evaluate(middles)
+            new_xs, new_ys = [], []
+            previous = 0
+            for i, x, y in zip(marked, middles, values):
+                new_xs.extend(xs[previous:i + 1])
+                new_ys.extend(ys[previous:i + 1])
+                new_xs.append(x)
+                new_ys.append(y)
+                previous = i + 1
+            new_xs.extend(xs[previous:])
+            new_ys.extend(ys[previous:])
+            xs, ys = new_xs, new_ys
+            if budget <= 0:
+                break
+
+        lines = []
+        line = []
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            if not isfinite(y) or (line and abs(y - line[-1][1]) * y_scale > jump):
+                if len(line) > 1:
+                    lines.append(line)
+                line = []
+            if isfinite(y):
+                line.append((x, y))
+        if len(line) > 1:
+            lines.append(line)
+        return lines
+
+
+class PlotWindow(tk.Toplevel):
+    def __init__(self, app, expression="sin(x)"):
+        super().__init__(app)
+        self.app = app
+        self.title("Plot")
+        self.geometry("640x480")
+
+        self.expression = tk.StringVar(value=expression)
+        self.status = tk.StringVar(value="")
+        self.sampler = None
+        self.view = [-10.0, 10.0, 0.0]  # x_min, x_max, y_center
+        self.drag = None
+        self.redraw_job = None
+
+        top = app.register_widget("frame", tk.Frame(self))
+        top.pack(fill="x")
+        app.register_widget("display", tk.Label(top, text="f(x) =", font=app.history_font)).pack(side="left")
+        entry = app.register_widget("history_input", tk.Entry(
+            top,
+            textvariable=self.expression,
+            font=app.history_font,
+            relief="flat"
+        ))
+        entry.pack(side="left", fill="x", expand=True, padx=5, pady=5)
+        entry.bind("<Return>", lambda event: self.set_expression())
+        app.register_widget("display", tk.Label(
+            top,
+            textvariable=self.status,
+            font=app.history_font
+        )).pack(side="right")
+
+        self.canvas = app.register_widget("display_frame", tk.Canvas(self, highlightthickness=0))
+        self.canvas.pack(fill="both", expand=True)
+        self.canvas.bind("<Configure>", lambda event: self.schedule_redraw())
+        self.canvas.bind("<ButtonPress-1>", self.start_drag)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<MouseWheel>", lambda event: self.zoom(event.x, 0.8 if event.delta > 0 else 1.25))
+        self.canvas.bind("<Button-4>", lambda event: self.zoom(event.x, 0.8))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom(event.x, 1.25))
+
+        self.set_expression()
+
+    def set_expression(self):
+        try:
+            self.sampler = FunctionSampler(self.expression.get(), self.app.radians)
+        except EvaluationError as exc:
+            self.sampler = None
+            self.status.set(str(exc))
+        self.schedule_redraw()
+
+    def schedule_redraw(self):
+        # Mouse events can arrive faster than frames; draw once per idle cycle
+        if self.redraw_job is None:
+            self.redraw_job = self.after_idle(self.redraw)
+
+    def start_drag(self, event):
+        self.drag = (event.x, event.y)
+
+    def on_drag(self, event):
+        width, height, x_scale = self.scales()
+        dx = (event.x - self.drag[0]) / x_scale
+        dy = (event.y - self.drag[1]) / x_scale
+        self.drag = (event.x, event.y)
+        self.view[0] -= dx
+        self.view[1] -= dx
+        self.view[2] += dy
+        self.schedule_redraw()
+
+    def zoom(self, pixel, factor):
+        width, height, x_scale = self.scales()
+        x = self.view[0] + pixel / x_scale
+        self.view[0] = x - (x - self.view[0]) * factor
+        self.view[1] = x + (self.view[1] - x) * factor
+        self.schedule_redraw()
+
+    def scales(self):
+        width = max(self.canvas.winfo_width(), 1)
+        height = max(self.canvas.winfo_height(), 1)
+        return width, height, width / (self.view[1] - self.view[0])
+
+    def redraw(self):
+        self.redraw_job = None
+        if self.sampler is not None and self.sampler.radians != self.app.radians:
+            self.set_expression()
+            return
+
+        theme = self.app.themes[self.app.theme]
+        width, height, scale = self.scales()
+        x_min, x_max, y_center = self.view
+        y_max = y_center + height / 2 / scale
+
+        def to_canvas(x, y):
+            return (x - x_min) * scale, (y_max - y) * scale
+
+        self.canvas.delete("all")
+        origin_x, origin_y = to_canvas(0, 0)
+        self.canvas.create_line(0, origin_y, width, origin_y, fill=theme["history_fg"])
+        self.canvas.create_line(origin_x, 0, origin_x, height, fill=theme["history_fg"])
+        if self.sampler is None:
+            return
+
+        before = self.sampler.evaluations
+        xs, ys = self.sampler.samples(x_min, x_max, width)
+        for line in self.sampler.refine(xs, ys, scale, height):
+            coords = []
+            for x, y in line:
+                cx, cy = to_canvas(x, y)
+                # Keep far off-screen points from overflowing canvas coordinates
+                coords.extend((cx, min(max(cy, -height), 2 * height)))
+            self.canvas.create_line(*coords, fill=theme["op_button_bg"], width=2)
+        self.status.set(f"x: {x_min:.4g} … {x_max:.4g}   evaluated {self.sampler.evaluations - before}")
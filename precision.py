@@ -0,0 +1,301 @@
+import ast
+import time
+from decimal import Decimal, localcontext
+from functools import lru_cache
+
+from engine import default_engine, check_cost, format_display, integer_bits, normalize
+
+try:
+    import mpmath
+except ImportError:  # the decimal backend below is used instead
+    mpmath = None
+
+DEFAULT_DIGITS = 50
+GUARD_DIGITS = 10  # extra working digits so the last shown digit is right
+MAX_DIGITS = 100000
+
+
+# Constants are memoized per precision, so repeated calculations at the same
+# number of digits never recompute them.
+
+@lru_cache(maxsize=32)
+def pi_digits(digits):
+    # Machin's formula, pi = 16 atan(1/5) - 4 atan(1/239), in fixed point
+    scale = 10 ** (digits + GUARD_DIGITS)
+
+    def arctan_inverse(n):
+        total = term = scale // n
+        k = 1
+        square = n * n
+        while term:
+            term //= square
+            k += 2
+            total += -(term // k) if k % 4 == 3 else term // k
+        return total
+
+    return Decimal(16 * arctan_inverse(5) - 4 * arctan_inverse(239)).scaleb(-(digits + GUARD_DIGITS))
+
+
+@lru_cache(maxsize=32)
+def e_digits(digits):
+    with localcontext() as context:
+        context.prec = digits + GUARD_DIGITS
+        return Decimal(1).exp()
+
+
+@lru_cache(maxsize=32)
+def ln10_digits(digits):
+    with localcontext() as context:
+        context.prec = digits + GUARD_DIGITS
+        return Decimal(10).ln()
+
+
+class DecimalFunctions:
+    # The calculator's function table over Decimal at a fixed precision.
+    # Must be used inside a localcontext with that precision.
+
+    def __init__(self, digits, radians=True):
+        self.digits = digits
+        self.radians = radians
+        self.pi = pi_digits(digits)
+        self.epsilon = Decimal(10) ** -(digits + GUARD_DIGITS)
+
+    def to_radians(self, value):
+        return value if self.radians else value * self.pi / 180
+
+    def from_radians(self, value):
+        return value if self.radians else value * 180 / self.pi
+
+    def reduce(self, value):
+        # Range reduction into [-pi, pi] with the cached pi
+        two_pi = 2 * self.pi
+        value = value % two_pi
+        if value > self.pi:
+            value -= two_pi
+        elif value < -self.pi:
+            value += two_pi
+        return value
+
+    def series(self, x, term, power):
+        # Taylor series of sin (term=x, power=1) or cos (term=1, power=0)
+        total = term
+        square = x * x
+        n = power
+        while abs(term) > self.epsilon:
+            term = -term * square / ((n + 1) * (n + 2))
+            n += 2
+            total += term
+        return total
+
+    def sin(self, value):
+        x = self.reduce(Decimal(self.to_radians(value)))
+        return +self.series(x, x, 1)
+
+    def cos(self, value):
+        x = self.reduce(Decimal(self.to_radians(value)))
+        return +self.series(x, Decimal(1), 0)
+
+    def tan(self, value):
+        x = self.reduce(Decimal(self.to_radians(value)))
+        cosine = self.series(x, Decimal(1), 0)
+        if cosine == 0:
+            raise ZeroDivisionError("tan is undefined here")
+        return +(self.series(x, x, 1) / cosine)
+
+    def arctan(self, x):
+        x = Decimal(x)
+        if x < 0:
+            return -self.arctan(-x)
+        if x > 1:
+            return self.pi / 2 - self.arctan(1 / x)
+        # Halve the argument until the series converges quickly
+        halvings = 0
+        while x > Decimal("0.1"):
+            x = x / (1 + (1 + x * x).sqrt())
+            halvings += 1
+        total = term = x
+        square = x * x
+        n = 1
+        while abs(term) > self.epsilon:
+            term = -term * square
+            n += 2
+            total += term / n
+        return total * 2 ** halvings
+
+    def atan(self, value):
+        return +self.from_radians(self.arctan(value))
+
+    def arcsin(self, x):
+        x = Decimal(x)
+        if abs(x) > 1:
+            raise ValueError("math domain error")
+        if abs(x) == 1:
+            return x * self.pi / 2
+        return self.arctan(x / (1 - x * x).sqrt())
+
+    def asin(self, value):
+        return +self.from_radians(self.arcsin(value))
+
+    def acos(self, value):
+        return +self.from_radians(self.pi / 2 - self.arcsin(value))
+
+    def log(self, value):
+        return +(Decimal(value).ln() / ln10_digits(self.digits))
+
+    def ln(self, value):
+        return +Decimal(value).ln()
+
+    def sqrt(self, value):
+        return +Decimal(value).sqrt()
+
+    def namespace(self):
+        return {
+            "__builtins__": {},
+            "sin": self.sin,
+            "cos": self.cos,
+            "tan": self.tan,
+            "asin": self.asin,
+            "acos": self.acos,
+            "atan": self.atan,
+            "log": self.log,
+            "ln": self.ln,
+            "sqrt": self.sqrt,
+            "radians": lambda value: Decimal(value) * self.pi / 180,
+            "degrees": lambda value: Decimal(value) * 180 / self.pi,
+            "pi": +self.pi,
+            "e": +e_digits(self.digits)
+        }
+
+
+def mpmath_namespace(radians):
+    def to_radians(f):
+        return f if radians else (lambda value: f(mpmath.radians(value)))
+
+    def from_radians(f):
+        return f if radians else (lambda value: mpmath.degrees(f(value)))
+
+    return {
+        "__builtins__": {},
+        "sin": to_radians(mpmath.sin),
+        "cos": to_radians(mpmath.cos),
+        "tan": to_radians(mpmath.tan),
+        "asin": from_radians(mpmath.asin),
+        "acos": from_radians(mpmath.acos),
+        "atan": from_radians(mpmath.atan),
+        "log": mpmath.log10,
+        "ln": mpmath.ln,
+        "sqrt": mpmath.sqrt,
+        "radians": mpmath.radians,
+        "degrees": mpmath.degrees,
+        "pi": +mpmath.pi,
+        "e": +mpmath.e
+    }
+
+
+def floor_divmod(a, b):
+    # Python's // and % round the quotient down; Decimal's truncate it
+    quotient, remainder = divmod(a, b)
+    if remainder and (remainder < 0) != (b < 0):
+        quotient -= 1
+        remainder += b
+    return quotient, remainder
+
+
+FLOOR_OPERATIONS = {
+    "_floordiv": lambda a, b: floor_divmod(a, b)[0],
+    "_mod": lambda a, b: floor_divmod(a, b)[1],
+}
+
+
+class PreciseTree(ast.NodeTransformer):
+    # Numbers in the expression are bound to generated names and kept as the
+    # text typed, to become exact Decimal/mpf values at evaluation time (an
+    # mpf is rounded to the working precision it is created at). // and %
+    # become calls that round like they do on floats.
+
+    def __init__(self):
+        self.values = {}
+
+    def visit_Constant(self, node):
+        name = f"_literal{len(self.values)}"
+        self.values[name] = repr(node.value)
+        return ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node)
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, (ast.FloorDiv, ast.Mod)):
+            name = "_floordiv" if isinstance(node.op, ast.FloorDiv) else "_mod"
+            call = ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=[node.left, node.right], keywords=[])
+            return ast.copy_location(call, node)
+        return node
+
+
+@lru_cache(maxsize=256)
+def compile_precise(expression):
+    # The engine validates and cost-checks the expression first
+    tree = default_engine.compile(expression).tree
+    precise = PreciseTree()
+    tree = ast.fix_missing_locations(precise.visit(ast.parse(ast.unparse(tree), mode="eval")))
+    return compile(tree, "<expression>", "eval"), precise.values
+
+
+def format_precise(result, digits):
+    if isinstance(result, int):
+        return format_display(result)
+    if mpmath is not None and isinstance(result, mpmath.mpf):
+        if result == int(result) and abs(result) < mpmath.mpf(10) ** digits:
+            return str(int(result))
+        return mpmath.nstr(result, digits)
+    if result == result.to_integral_value() and result.adjusted() < digits:
+        return str(int(result))
+    return str(result)
+
+
+def evaluate(expression, digits=DEFAULT_DIGITS, radians=True, variables=None):
+    # Returns the result and the seconds it took, so the cost of each extra
+    # digit is visible. Variables are taken at the value their shortest repr
+    # shows, as if typed, like the literals.
+    start = time.perf_counter()
+    expression = normalize(expression)
+    code, literals = compile_precise(expression)
+    if variables:
+        bits = integer_bits(variables)
+        if bits:
+            check_cost(default_engine.compile(expression).tree, names=bits)
+        literals = dict(literals, **{name: repr(value) for name, value in variables.items()})
+
+    if mpmath is not None:
+        with mpmath.workdps(digits + GUARD_DIGITS):
+            values = {name: mpmath.mpf(text) for name, text in literals.items()}
+            result = eval(code, dict(mpmath_namespace(radians), **FLOOR_OPERATIONS, **values))
+        with mpmath.workdps(digits):
+            result = +result
+    else:
+        with localcontext() as context:
+            context.prec = digits + GUARD_DIGITS
+            values = {name: Decimal(text) for name, text in literals.items()}
+            result = eval(code, dict(DecimalFunctions(digits, radians).namespace(), **FLOOR_OPERATIONS, **values))
+            context.prec = digits
+            result = +Decimal(result)
+    return result, time.perf_counter() - start
+
+
+def calculate(arguments):
+    # Precision-mode counterpart of engine.calculate, taking one tuple so it
+    # can be sent to a worker: (expression, digits, radians, variables), with
+    # variables a {name: value} dict or None.
+    expression, digits, radians, variables = arguments
+    expression = normalize(expression)
+
+    # Handle percentage
+    if "%" in expression:
+        parts = expression.split("%")
+        if len(parts) == 2:
+            start = time.perf_counter()
+            with localcontext() as context:
+                context.prec = digits
+                result = Decimal(parts[0]) * Decimal(parts[1]) / 100
+            return f"{parts[0]}% of {parts[1]}", format_precise(result, digits), time.perf_counter() - start
+
+    result, seconds = evaluate(expression, digits, radians, variables)
+    return expression, format_precise(result, digits), seconds
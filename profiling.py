@@ -0,0 +1,206 @@
+import sys
+import threading
+import time
+import tkinter as tk
+from collections import Counter
+from functools import wraps
+from math import frexp, ldexp
+
+HOT_PATHS = (
+    "evaluate",
+    "on_evaluated",
+    "on_scientific_button",
+    "add_to_history",
+    "save_history",
+    "update_history_display",
+    "apply_theme",
+)
+SUBBUCKETS = 8  # histogram buckets per power of two, about 9% apart
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+
+
+class Histogram:
+    # Latencies in log-scale buckets: fixed memory however many calls are
+    # recorded, and percentiles within a bucket's width.
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        mantissa, exponent = frexp(seconds * 1e9)  # nanoseconds = mantissa * 2**exponent
+        self.buckets[exponent * SUBBUCKETS + int((mantissa - 0.5) * 2 * SUBBUCKETS)] += 1
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                exponent, sub = divmod(bucket, SUBBUCKETS)
+                # Middle of the bucket, in seconds
+                return min(ldexp(0.5 + (sub + 0.5) / (2 * SUBBUCKETS), exponent) / 1e9, self.max)
+        return self.max
+
+
+class Instrumentation:
+    # Times an object's methods while enabled. Enabling shadows each method
+    # with a timing wrapper stored on the instance; disabling deletes the
+    # wrappers, so the class methods run untouched and nothing is paid.
+    # Callbacks must look the methods up when called (as the calculator's
+    # lambdas do) rather than holding on to bound methods.
+
+    def __init__(self, target, names=HOT_PATHS):
+        self.target = target
+        self.names = names
+        self.enabled = False
+        self.histograms = {}
+        self.started = {}
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        for name in self.names:
+            setattr(self.target, name, self.wrap(name, getattr(type(self.target), name).__get__(self.target)))
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        for name in self.names:
+            self.target.__dict__.pop(name, None)
+
+    def reset(self):
+        self.histograms.clear()
+        self.started.clear()
+
+    def wrap(self, name, method):
+        histogram = self.histograms.setdefault(name, Histogram())
+        # evaluate only hands the expression to the worker; the time until
+        # on_evaluated sees the result is recorded as "evaluate → result"
+        round_trip = self.histograms.setdefault("evaluate → result", Histogram())
+
+        @wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                histogram.record(end - start)
+                if name == "evaluate":
+                    self.started["evaluate"] = start
+                elif name == "on_evaluated" and "evaluate" in self.started:
+                    round_trip.record(end - self.started.pop("evaluate"))
+        return timed
+
+    def rows(self):
+        # (name, count, mean, p50, p99, max) with times in seconds
+        return [
+            (name, h.count, h.total / h.count, h.percentile(0.5), h.percentile(0.99), h.max)
+            for name, h in sorted(self.histograms.items())
+            if h.count
+        ]
+
+
+class SamplingProfiler:
+    # Samples the stack of one thread from a background thread and counts
+    # each distinct stack. Saved in the "folded" format read by flame graph
+    # tools: one "outer;inner;leaf count" line per stack.
+
+    def __init__(self, thread=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = (thread or threading.main_thread()).ident
+        self.interval = interval
+        self.stacks = Counter()
+        self.running = False
+        self.sampler = None
+
+    def enable(self):
+        self.running = True
+        self.sampler = threading.Thread(target=self.run, daemon=True)
+        self.sampler.start()
+
+    def disable(self):
+        self.running = False
+        if self.sampler is not None:
+            self.sampler.join()
+            self.sampler = None
+
+    def run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def dump_stats(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class TimingsWindow(tk.Toplevel):
+    REFRESH = 500  # milliseconds
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.title("Timings")
+        self.geometry("560x260")
+
+        buttons = app.register_widget("frame", tk.Frame(self))
+        buttons.pack(fill="x", padx=5, pady=5)
+        app.register_widget("button", tk.Button(
+            buttons,
+            text="Reset",
+            font=app.history_font,
+            relief="flat",
+            command=app.instrumentation.reset
+        )).pack(side="left")
+        self.status = tk.StringVar(value="")
+        app.register_widget("display", tk.Label(
+            buttons,
+            textvariable=self.status,
+            font=app.history_font
+        )).pack(side="right")
+
+        self.text = app.register_widget("history", tk.Text(
+            self,
+            font=("Courier", 10),
+            state="disabled",
+            wrap="none",
+            padx=5,
+            pady=5
+        ))
+        self.text.pack(fill="both", expand=True, padx=5, pady=5)
+        self.render()
+
+    def render(self):
+        if not self.winfo_exists():
+            return
+        instrumentation = self.app.instrumentation
+        self.status.set("recording" if instrumentation.enabled else "off: Debug > Record Timings")
+        lines = [f"{'operation':26} {'count':>7} {'mean':>9} {'p50':>9} {'p99':>9} {'max':>9}"]
+        for name, count, mean, p50, p99, longest in instrumentation.rows():
+            lines.append(
+                f"{name:26} {count:7} " + " ".join(f"{value * 1000:7.2f}ms" for value in (mean, p50, p99, longest))
+            )
+        self.text.config(state="normal")
+        self.text.delete(1.0, "end")
+        self.text.insert("end", "\n".join(lines))
+        self.text.config(state="disabled")
+        self.after(self.REFRESH, self.render)
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from background import serve, DEFAULT_MEMORY_LIMIT, DEFAULT_TIMEOUT
+from engine import default_engine, format_display, FUNCTIONS, CONSTANTS
+from precision import MAX_DIGITS
+
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 256  # requests waiting for a worker before readers stop reading
+LATENCY_SAMPLES = 1000  # recent request latencies kept for the stats percentiles
+MAX_LINE = 1024 * 1024  # bytes in one request line
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+EVALUATION_ERROR = -32000
+TIMEOUT_ERROR = -32001
+
+
+class RequestError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+# Run in the worker processes. Each worker keeps its own default_engine, so
+# the compiled-expression cache stays warm between requests.
+
+def calculate_request(params):
+    expression = params["expression"]
+    if "digits" in params:
+        from precision import calculate as precise_calculate
+        expression, result, seconds = precise_calculate((expression, params["digits"], True, params.get("variables")))
+        return {"expression": expression, "result": result, "seconds": seconds}
+    expression, result = default_engine.calculate(expression, params.get("variables"))
+    return {"expression": expression, "result": format_display(result)}
+
+
+def cache_info(params):
+    return default_engine.cache_info()
+
+
+WORKER_METHODS = {
+    "calculate": calculate_request,
+    "cache_info": cache_info,
+}
+
+
+def check_calculate_params(params):
+    if not isinstance(params.get("expression"), str):
+        raise RequestError(INVALID_PARAMS, "expression must be a string")
+    if "digits" in params:
+        digits = params["digits"]
+        if not isinstance(digits, int) or isinstance(digits, bool) or not 1 <= digits <= MAX_DIGITS:
+            raise RequestError(INVALID_PARAMS, f"digits must be an integer from 1 to {MAX_DIGITS}")
+    variables = params.get("variables")
+    if variables is None:
+        return
+    if not isinstance(variables, dict):
+        raise RequestError(INVALID_PARAMS, "variables must be an object")
+    for name, value in variables.items():
+        # Only numbers: the cost guard sizes integers, and a string or list
+        # would be repeated by * without limit. Names may not shadow functions.
+        if not name.isidentifier() or name.startswith("_") or name in FUNCTIONS or name in CONSTANTS:
+            raise RequestError(INVALID_PARAMS, f"Invalid variable name: {name!r}")
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise RequestError(INVALID_PARAMS, f"Variable {name!r} must be a number")
+
+
+class Worker:
+    # One worker process running background.serve, used by one dispatcher at
+    # a time. Like BackgroundEvaluator, a job that runs past its deadline gets
+    # its process killed; a new one is started for the next job.
+
+    def __init__(self, context, memory_limit):
+        self.context = context
+        self.memory_limit = memory_limit
+        self.process = None
+        self.connection = None
+
+    def start(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        self.stop()
+        self.connection, child_connection = self.context.Pipe()
+        self.process = self.context.Process(
+            target=serve,
+            args=(child_connection, self.memory_limit),
+            daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+
+    def run(self, function, params, timeout):
+        # Blocking; returns (ok, result or error message)
+        self.start()
+        try:
+            self.connection.send((function, params))
+            if self.connection.poll(timeout):
+                return self.connection.recv()
+        except (EOFError, OSError):
+            self.stop()
+            return False, "Worker exited"
+        self.stop()
+        return False, None
+
+    def stop(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+            self.process = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class EvaluationServer:
+    # Newline-delimited JSON-RPC 2.0 over a localhost TCP socket. A line holds
+    # one request object or a batch (a JSON array of them). Calculations go
+    # through a bounded queue to worker processes: when the queue is full,
+    # connections stop being read, so clients are slowed down by TCP instead
+    # of the server buffering without limit. Each request has its own timeout;
+    # a request still running when it expires has its worker killed.
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, workers=1, timeout=DEFAULT_TIMEOUT,
+                 queue_size=DEFAULT_QUEUE_SIZE, memory_limit=DEFAULT_MEMORY_LIMIT):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.memory_limit = memory_limit
+        self.pool = None  # threads waiting on the workers
+        self.worker_processes = []
+        self.queue = None
+        self.dispatchers = []
+        self.server = None
+
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.running = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    async def start(self):
+        context = multiprocessing.get_context("spawn")
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.worker_processes = [Worker(context, self.memory_limit) for _ in range(self.workers)]
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        # One dispatcher per worker keeps every worker busy without
+        # submitting more than the workers can run
+        self.dispatchers = [asyncio.create_task(self.dispatch(worker)) for worker in self.worker_processes]
+        self.server = await asyncio.start_server(
+            self.handle_connection, self.host, self.port, limit=MAX_LINE
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Serving JSON-RPC on {self.host}:{self.port}", file=sys.stderr, flush=True)
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+        for task in self.dispatchers:
+            task.cancel()
+        # Killing the workers also ends any thread waiting on one
+        for worker in self.worker_processes:
+            worker.stop()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    async def dispatch(self, worker):
+        loop = asyncio.get_running_loop()
+        while True:
+            function, params, future, deadline = await self.queue.get()
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if future.done() or (remaining is not None and remaining <= 0):  # timed out while waiting in the queue
+                continue
+            self.running += 1
+            try:
+                ok, result = await loop.run_in_executor(self.pool, worker.run, function, params, remaining)
+            finally:
+                self.running -= 1
+            if future.done():
+                continue
+            if ok:
+                future.set_result(result)
+            elif result is None:
+                future.set_exception(asyncio.TimeoutError())
+            else:
+                future.set_exception(RequestError(EVALUATION_ERROR, result))
+
+    async def run_in_worker(self, function, params):
+        future = asyncio.get_running_loop().create_future()
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        await self.queue.put((function, params, future, deadline))
+        return await future
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    response = error_response(None, INVALID_REQUEST, "Request line too long")
+                    writer.write(json.dumps(response).encode() + b"\n")
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = await self.handle_line(line)
+                if response is not None:
+                    writer.write(json.dumps(response).encode() + b"\n")
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_line(self, line):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return error_response(None, PARSE_ERROR, "Parse error")
+        if isinstance(message, list):
+            if not message:
+                return error_response(None, INVALID_REQUEST, "Empty batch")
+            responses = await asyncio.gather(*(self.handle_request(request) for request in message))
+            # Notifications (no id) get no response, per JSON-RPC
+            return [response for response in responses if response is not None] or None
+        return await self.handle_request(message)
+
+    async def handle_request(self, request):
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or "method" not in request:
+            return error_response(None, INVALID_REQUEST, "Invalid request")
+        request_id = request.get("id")
+        start = time.perf_counter()
+        self.requests += 1
+        try:
+            result = await asyncio.wait_for(
+                self.call(request["method"], request.get("params", {})),
+                self.timeout
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            response = error_response(request_id, TIMEOUT_ERROR, "Timeout")
+        except RequestError as exc:
+            self.errors += 1
+            response = error_response(request_id, exc.code, str(exc))
+        except Exception as exc:
+            self.errors += 1
+            response = error_response(request_id, EVALUATION_ERROR, f"{type(exc).__name__}: {exc}")
+        else:
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        self.latencies.append(time.perf_counter() - start)
+        return response if "id" in request else None
+
+    async def call(self, method, params):
+        if method == "stats":
+            return self.stats()
+        if method not in WORKER_METHODS:
+            raise RequestError(METHOD_NOT_FOUND, f"Method not found: {method}")
+        if isinstance(params, list) and method == "calculate":
+            params = dict(zip(("expression", "variables"), params))
+        if not isinstance(params, dict):
+            raise RequestError(INVALID_PARAMS, "Invalid params")
+        if method == "calculate":
+            check_calculate_params(params)
+        return await self.run_in_worker(WORKER_METHODS[method], params)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(int(fraction * len(latencies)), len(latencies) - 1)]
+
+        return {
+            "uptime": time.monotonic() - self.started,
+            "workers": self.workers,
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "queue_size": self.queue_size,
+            "running": self.running,
+            "latency_p50": percentile(0.5),
+            "latency_p99": percentile(0.99),
+        }
+
+
+def error_response(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+def run_server(port=DEFAULT_PORT, workers=1, timeout=DEFAULT_TIMEOUT, queue_size=DEFAULT_QUEUE_SIZE):
+    server = EvaluationServer(port=port, workers=workers, timeout=timeout, queue_size=queue_size)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,271 @@
+import re
+import tkinter as tk
+from collections import deque
+
+from engine import default_engine, EvaluationError, FUNCTIONS, CONSTANTS, format_display, format_result
+
+ASSIGNMENT = re.compile(r"^\s*([A-Za-z]\w*)\s*=(?!=)(.*)$")
+
+
+def parse_assignment(text):
+    # "b = a^2 + sin(a)" -> ("b", "a^2 + sin(a)"), or None for a plain expression
+    match = ASSIGNMENT.match(text)
+    if match is None:
+        return None
+    return match.group(1), match.group(2).strip()
+
+
+class Sheet:
+    # Named formulas such as b = a^2 + sin(a), like cells of a spreadsheet.
+    # Every value is cached. When a definition changes only the cells
+    # downstream of it are recomputed, in topological order, and a cell whose
+    # value comes out unchanged stops the recomputation from spreading further.
+
+    def __init__(self, radians=True, engine=default_engine):
+        self.radians = radians
+        self.engine = engine
+        self.formulas = {}  # name -> normalized formula
+        self.dependencies = {}  # name -> names its formula uses
+        self.dependents = {}  # name -> names whose formulas use it, defined or not
+        self.values = {}
+        self.errors = {}
+        self.recomputed = 0
+
+    def __getstate__(self):
+        # Sent to a worker process without the engine, whose compiled code
+        # cannot be pickled; the copy there uses that process's default_engine
+        state = dict(self.__dict__)
+        del state["engine"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.engine = default_engine
+
+    def __len__(self):
+        return len(self.formulas)
+
+    def __contains__(self, name):
+        return name in self.formulas
+
+    def names(self):
+        return sorted(self.formulas)
+
+    def define(self, name, formula):
+        # Returns the names whose value or error changed, in evaluation order
+        if not name.isidentifier() or name.startswith("_") or name in FUNCTIONS or name in CONSTANTS:
+            raise EvaluationError(f"Cannot assign to {name!r}")
+        compiled = self.engine.compile(formula)
+        uses = compiled.names
+        if self.reaches(uses, name):
+            raise EvaluationError(f"Circular reference through {name}")
+
+        for used in self.dependencies.get(name, ()):
+            self.dependents[used].discard(name)
+        for used in uses:
+            self.dependents.setdefault(used, set()).add(name)
+        self.formulas[name] = compiled.source
+        self.dependencies[name] = uses
+        return self.recompute({name})
+
+    def remove(self, name):
+        if name not in self.formulas:
+            return []
+        for used in self.dependencies.pop(name):
+            self.dependents[used].discard(name)
+        del self.formulas[name]
+        self.values.pop(name, None)
+        self.errors.pop(name, None)
+        return [name] + self.recompute(self.dependents.get(name, set()))
+
+    def reaches(self, sources, target):
+        # True if target's value flows into any of sources
+        stack = [target]
+        seen = set()
+        while stack:
+            name = stack.pop()
+            if name in sources:
+                return True
+            if name not in seen:
+                seen.add(name)
+                stack.extend(self.dependents.get(name, ()))
+        return False
+
+    def downstream(self, roots):
+        cells = set()
+        stack = list(roots)
+        while stack:
+            name = stack.pop()
+            if name not in cells:
+                cells.add(name)
+                stack.extend(self.dependents.get(name, ()))
+        return cells
+
+    def order(self, cells):
+        # Kahn's algorithm over the subgraph of the given cells
+        waiting = {name: len(self.dependencies.get(name, set()) & cells) for name in cells}
+        ready = deque(name for name, count in waiting.items() if count == 0)
+        ordered = []
+        while ready:
+            name = ready.popleft()
+            ordered.append(name)
+            for dependent in self.dependents.get(name, ()):
+                if dependent in waiting:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0:
+                        ready.append(dependent)
+        return ordered
+
+    def recompute(self, roots):
+        changed = set()
+        updated = []
+        for name in self.order(self.downstream(roots)):
+            if name not in self.formulas:
+                continue
+            if name not in roots and not self.dependencies[name] & changed:
+                continue
+            before = (self.values.get(name), self.errors.get(name))
+            self.compute(name)
+            if (self.values.get(name), self.errors.get(name)) != before:
+                changed.add(name)
+            if name in changed or name in roots:
+                updated.append(name)
+        return updated
+
+    def compute(self, name):
+        self.recomputed += 1
+        dependencies = self.dependencies[name]
+        missing = [used for used in dependencies if used not in self.values]
+        if missing:
+            self.values.pop(name, None)
+            self.errors[name] = f"Undefined: {', '.join(sorted(missing))}"
+            return
+        try:
+            value = self.engine.evaluate(
+                self.formulas[name],
+                {used: self.values[used] for used in dependencies},
+                self.radians
+            )
+        except Exception as exc:
+            self.values.pop(name, None)
+            self.errors[name] = str(exc) or type(exc).__name__
+        else:
+            self.values[name] = value
+            self.errors.pop(name, None)
+
+    def set_radians(self, radians):
+        if radians != self.radians:
+            self.radians = radians
+            self.recompute(set(self.formulas))
+
+    def variables(self, expression):
+        # The values an expression refers to, to send along with it to a worker
+        names = self.engine.compile(expression).names
+        return {name: self.values[name] for name in names if name in self.values}
+
+
+def update_sheet(arguments):
+    # Runs in a worker: (sheet, radians, action, args) brings the sheet to the
+    # angle mode, then calls sheet.action(*args) unless action is None.
+    # Returns the updated sheet and the names the action changed.
+    sheet, radians, action, args = arguments
+    sheet.set_radians(radians)
+    updated = getattr(sheet, action)(*args) if action else []
+    return sheet, updated
+
+
+def error_message(error):
+    # "EvaluationError: Circular reference through a" -> the part after the type
+    return error.partition(": ")[2] or error
+
+
+class VariablesWindow(tk.Toplevel):
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.title("Variables")
+        self.geometry("420x400")
+
+        self.definition = tk.StringVar(value="")
+        self.status = tk.StringVar(value="")
+        self.lines = []
+
+        top = app.register_widget("frame", tk.Frame(self))
+        top.pack(fill="x")
+        entry = app.register_widget("history_input", tk.Entry(
+            top,
+            textvariable=self.definition,
+            font=app.history_font,
+            relief="flat"
+        ))
+        entry.pack(fill="x", padx=5, pady=5)
+        entry.bind("<Return>", lambda event: self.define())
+        entry.focus_set()
+        app.register_widget("display", tk.Label(
+            top,
+            textvariable=self.status,
+            font=app.history_font,
+            anchor="w"
+        )).pack(fill="x", padx=5)
+
+        self.text = app.register_widget("history", tk.Text(
+            self,
+            font=app.history_font,
+            state="disabled",
+            wrap="none",
+            cursor="hand2",
+            padx=5,
+            pady=5
+        ))
+        self.text.pack(fill="both", expand=True, padx=5, pady=5)
+        self.text.bind("<Button-1>", self.on_click)
+        self.render()
+
+    def define(self):
+        # "name = formula" defines or changes a variable, "name =" removes it
+        assignment = parse_assignment(self.definition.get())
+        if assignment is None:
+            self.status.set("Enter name = formula")
+            return
+        name, formula = assignment
+        before = self.app.sheet.recomputed
+
+        def done(updated):
+            if not self.winfo_exists():
+                return
+            sheet = self.app.sheet
+            self.definition.set("")
+            self.status.set(f"{len(updated)} updated, {sheet.recomputed - before} recomputed of {len(sheet)}")
+
+        def failed(error):
+            if self.winfo_exists():
+                self.status.set(error_message(error))
+
+        self.status.set("Computing…")
+        if formula:
+            self.app.update_sheet("define", (name, formula), done, failed)
+        else:
+            self.app.update_sheet("remove", (name,), done, failed)
+
+    def render(self):
+        sheet = self.app.sheet
+        self.lines = sheet.names()
+        rows = []
+        for name in self.lines:
+            if name in sheet.values:
+                shown = format_display(format_result(sheet.values[name]))
+            else:
+                shown = sheet.errors.get(name, "")
+            rows.append(f"{name} = {sheet.formulas[name]}  →  {shown}")
+        self.text.config(state="normal")
+        self.text.delete(1.0, "end")
+        self.text.insert("end", "\n".join(rows))
+        self.text.config(state="disabled")
+
+    def on_click(self, event):
+        # Clicking a variable puts its name into the definition line for editing
+        line = int(self.text.index(f"@{event.x},{event.y}").split(".")[0]) - 1
+        if 0 <= line < len(self.lines):
+            name = self.lines[line]
+            self.definition.set(f"{name} = {self.app.sheet.formulas[name]}")
+        return "break"
@@ -0,0 +1,326 @@
+import time
+import tkinter as tk
+from collections import namedtuple
+from math import isfinite, sqrt
+
+from engine import default_engine, namespace, as_floats, EvaluationError
+
+SolveResult = namedtuple("SolveResult", "value error iterations evaluations seconds")
+
+TOLERANCE = 1e-12
+MAX_ITERATIONS = 200
+SCAN_POINTS = 1024  # grid used to bracket roots and extrema
+
+# 15-point Kronrod nodes on [-1, 1] (non-negative half) with their weights,
+# and the weights of the embedded 7-point Gauss rule (odd-indexed nodes).
+KRONROD_NODES = (
+    0.991455371120812639206854697526329,
+    0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926,
+    0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013,
+    0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245,
+    0.000000000000000000000000000000000,
+)
+KRONROD_WEIGHTS = (
+    0.022935322010529224963732008058970,
+    0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518,
+    0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550,
+    0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649,
+    0.209482141084727828012999174891714,
+)
+GAUSS_WEIGHTS = (
+    0.129484966168869693270611432679082,
+    0.279705391489276667901467771423780,
+    0.381830050505118944950369775488975,
+    0.417959183673469387755102040816327,
+)
+
+
+class Function:
+    # f(x) for one expression: compiled once, evaluated either one point at a
+    # time (for the sequential parts of Brent and Newton) or a batch at a time.
+
+    def __init__(self, expression, radians=True, engine=default_engine):
+        self.expression = expression
+        self.radians = radians
+        self.engine = engine
+        self.compiled = engine.compile_function(expression)
+        self.namespace = namespace(radians)
+        self.evaluations = 0
+
+    def __call__(self, x):
+        self.evaluations += 1
+        try:
+            return float(self.compiled({"x": x}, self.namespace))
+        except (ValueError, ZeroDivisionError, OverflowError):
+            return float("nan")
+
+    def batch(self, xs):
+        self.evaluations += len(xs)
+        return as_floats(self.engine.evaluate_array(self.expression, {"x": xs}, self.radians))
+
+
+def grid(a, b, points=SCAN_POINTS):
+    return [a + (b - a) * i / (points - 1) for i in range(points)]
+
+
+def timed(solve):
+    def run(expression, *args, radians=True, **kwargs):
+        f = Function(expression, radians)
+        start = time.perf_counter()
+        value, error, iterations = solve(f, *args, **kwargs)
+        return SolveResult(value, error, iterations, f.evaluations, time.perf_counter() - start)
+    run.__name__ = solve.__name__
+    return run
+
+
+def brent(f, a, b, fa, fb, tolerance, max_iterations):
+    # Brent's method on a bracket with f(a), f(b) of opposite signs
+    c, fc = a, fa
+    d = e = b - a
+    for iteration in range(1, max_iterations + 1):
+        if fb * fc > 0:
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol = 2 * 2.2e-16 * abs(b) + tolerance / 2
+        m = (c - b) / 2
+        if abs(m) <= tol or fb == 0:
+            return b, abs(m), iteration
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            s = fb / fa
+            if a == c:
+                p, q = 2 * m * s, 1 - s
+            else:
+                q, r = fa / fc, fb / fc
+                p = s * (2 * m * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            p = abs(p)
+            if 2 * p < min(3 * m * q - abs(tol * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = m
+        else:
+            d = e = m
+        a, fa = b, fb
+        b += d if abs(d) > tol else (tol if m > 0 else -tol)
+        fb = f(b)
+    return b, abs(c - b), max_iterations
+
+
+@timed
+def find_root(f, a, b, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    # Brackets a sign change on a batched grid over [a, b], then refines it
+    # with Brent's method. A sign change across a pole, as tan(x) has at
+    # pi/2, converges to a point where |f| is larger than at either end of
+    # the bracket; it is skipped.
+    xs = grid(a, b)
+    ys = f.batch(xs)
+    poles = 0
+    for i in range(len(xs)):
+        if ys[i] == 0:
+            return xs[i], 0.0, 0
+        if i + 1 < len(xs) and isfinite(ys[i]) and isfinite(ys[i + 1]) and ys[i] * ys[i + 1] < 0:
+            root, error, iterations = brent(f, xs[i], xs[i + 1], ys[i], ys[i + 1], tolerance, max_iterations)
+            if abs(f(root)) <= min(abs(ys[i]), abs(ys[i + 1])):
+                return root, error, iterations
+            poles += 1
+    if poles:
+        raise EvaluationError(f"{f.expression} only changes sign at discontinuities between {a} and {b}")
+    raise EvaluationError(f"No sign change of {f.expression} between {a} and {b}")
+
+
+@timed
+def newton(f, x0, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    # Newton's method with a central-difference derivative; f(x) and both
+    # difference points are evaluated as one batch per step.
+    x = x0
+    for iteration in range(1, max_iterations + 1):
+        h = 1e-6 * max(abs(x), 1.0)
+        y, forward, backward = f.batch([x, x + h, x - h])
+        derivative = (forward - backward) / (2 * h)
+        if not isfinite(y) or not isfinite(derivative) or derivative == 0:
+            raise EvaluationError(f"Newton's method stalled at x = {x}")
+        step = y / derivative
+        x -= step
+        if abs(step) <= tolerance * max(abs(x), 1.0):
+            return x, abs(step), iteration
+    raise EvaluationError(f"Newton's method did not converge from x = {x0}")
+
+
+def kronrod_nodes(a, b):
+    center, half = (a + b) / 2, (b - a) / 2
+    return [center - half * node for node in KRONROD_NODES] + [center + half * node for node in KRONROD_NODES[-2::-1]]
+
+
+def kronrod_sums(a, b, ys):
+    # ys are f at kronrod_nodes(a, b): 8 left-to-center, 7 right
+    half = (b - a) / 2
+    pairs = [ys[i] + ys[14 - i] for i in range(7)]
+    kronrod = sum(w * p for w, p in zip(KRONROD_WEIGHTS, pairs)) + KRONROD_WEIGHTS[7] * ys[7]
+    gauss = sum(GAUSS_WEIGHTS[j] * pairs[2 * j + 1] for j in range(3)) + GAUSS_WEIGHTS[3] * ys[7]
+    return kronrod * half, abs(kronrod - gauss) * half
+
+
+@timed
+def integrate(f, a, b, tolerance=1e-10, max_iterations=MAX_ITERATIONS):
+    # The integral from b down to a is minus the one from a to b
+    if a == b:
+        return 0.0, 0.0, 0
+    if b < a:
+        value, error, iterations = gauss_kronrod(f, b, a, tolerance, max_iterations)
+        return -value, error, iterations
+    return gauss_kronrod(f, a, b, tolerance, max_iterations)
+
+
+def gauss_kronrod(f, a, b, tolerance, max_iterations):
+    # Adaptive Gauss-Kronrod (G7, K15) for a < b. Every round bisects the
+    # intervals whose error estimate is too large and evaluates all of their
+    # nodes in one batch.
+    pending = [(a, b)]
+    total = error = 0.0
+    for iteration in range(1, max_iterations + 1):
+        xs = []
+        for left, right in pending:
+            xs.extend(kronrod_nodes(left, right))
+        ys = f.batch(xs)
+
+        refine = []
+        for i, (left, right) in enumerate(pending):
+            value, estimate = kronrod_sums(left, right, ys[15 * i:15 * i + 15])
+            if not isfinite(value):
+                raise EvaluationError(f"{f.expression} is not finite on [{left}, {right}]")
+            share = tolerance * (right - left) / (b - a)
+            if estimate <= max(share, 1e-15 * abs(value)) or right - left < 1e-12 * abs(b - a):
+                total += value
+                error += estimate
+            else:
+                middle = (left + right) / 2
+                refine.extend(((left, middle), (middle, right)))
+        if not refine:
+            return total, error, iteration
+        pending = refine
+    raise EvaluationError(f"Integration of {f.expression} did not converge")
+
+
+def golden_section(f, a, b, sign, tolerance, max_iterations):
+    ratio = (sqrt(5) - 1) / 2
+    c, d = b - ratio * (b - a), a + ratio * (b - a)
+    fc, fd = sign * f(c), sign * f(d)
+    for iteration in range(1, max_iterations + 1):
+        if abs(b - a) <= tolerance * max(abs(c), 1.0):
+            break
+        if fc < fd:
+            b, d, fd = d, c, fc
+            c = b - ratio * (b - a)
+            fc = sign * f(c)
+        else:
+            a, c, fc = c, d, fd
+            d = a + ratio * (b - a)
+            fd = sign * f(d)
+    x = (a + b) / 2
+    return x, abs(b - a), iteration
+
+
+def extremum(f, a, b, sign, tolerance, max_iterations):
+    # The best point of a batched grid, then golden-section search between
+    # its neighbours. sign is 1 for a minimum and -1 for a maximum.
+    xs = grid(a, b)
+    ys = [sign * y if isfinite(y) else float("inf") for y in f.batch(xs)]
+    best = min(range(len(xs)), key=ys.__getitem__)
+    if ys[best] == float("inf"):
+        raise EvaluationError(f"{f.expression} is undefined on [{a}, {b}]")
+    left, right = xs[max(best - 1, 0)], xs[min(best + 1, len(xs) - 1)]
+    return golden_section(f, left, right, sign, tolerance, max_iterations)
+
+
+@timed
+def minimize(f, a, b, tolerance=1e-10, max_iterations=MAX_ITERATIONS):
+    return extremum(f, a, b, 1, tolerance, max_iterations)
+
+
+@timed
+def maximize(f, a, b, tolerance=1e-10, max_iterations=MAX_ITERATIONS):
+    return extremum(f, a, b, -1, tolerance, max_iterations)
+
+
+class SolverWindow(tk.Toplevel):
+    def __init__(self, app, expression="x^2-2"):
+        super().__init__(app)
+        self.app = app
+        self.title("Solve")
+        self.resizable(False, False)
+
+        self.fields = {}
+        self.result = None
+        self.output = tk.StringVar(value="")
+
+        form = app.register_widget("frame", tk.Frame(self))
+        form.pack(fill="x", padx=5, pady=5)
+        for column, (name, default) in enumerate([("f(x)", expression), ("a", "0"), ("b", "2")]):
+            app.register_widget("display", tk.Label(form, text=name, font=app.history_font)).grid(
+                row=0, column=column, sticky="w"
+            )
+            variable = tk.StringVar(value=default)
+            app.register_widget("history_input", tk.Entry(
+                form,
+                textvariable=variable,
+                font=app.history_font,
+                width=20 if column == 0 else 8,
+                relief="flat"
+            )).grid(row=1, column=column, sticky="ew", padx=2)
+            self.fields[name] = variable
+
+        buttons = app.register_widget("frame", tk.Frame(self))
+        buttons.pack(fill="x", padx=5)
+        for text, command in [
+            ("Root", lambda: self.solve(find_root, "a", "b")),
+            ("Newton", lambda: self.solve(newton, "a")),
+            ("∫", lambda: self.solve(integrate, "a", "b")),
+            ("Min", lambda: self.solve(minimize, "a", "b")),
+            ("Max", lambda: self.solve(maximize, "a", "b")),
+            ("Use result", self.use_result)
+        ]:
+            app.register_widget("sci_button", tk.Button(
+                buttons,
+                text=text,
+                font=app.history_font,
+                relief="flat",
+                command=command
+            )).pack(side="left", padx=2, pady=2)
+
+        app.register_widget("display", tk.Label(
+            self,
+            textvariable=self.output,
+            font=app.history_font,
+            justify="left",
+            anchor="w"
+        )).pack(fill="x", padx=5, pady=5)
+
+    def solve(self, method, *fields):
+        try:
+            bounds = [float(self.fields[name].get()) for name in fields]
+            result = method(self.fields["f(x)"].get(), *bounds, radians=self.app.radians)
+        except (EvaluationError, ValueError, ZeroDivisionError, OverflowError) as exc:
+            self.result = None
+            self.output.set(str(exc))
+            return
+        self.result = result
+        self.output.set(
+            f"{method.__name__}: {result.value:.15g}  (± {result.error:.2g})\n"
+            f"{result.iterations} iterations, {result.evaluations} evaluations, "
+            f"{result.seconds * 1000:.2f} ms"
+        )
+
+    def use_result(self):
+        if self.result is not None:
+            self.app.current_input.set(str(self.result.value))
@@ -0,0 +1,231 @@
+import csv
+import threading
+import tkinter as tk
+from collections import OrderedDict
+from math import floor, isfinite
+
+from engine import default_engine, EvaluationError, as_floats, format_result
+
+CHUNK = 1024  # rows evaluated per batch
+MAX_CHUNKS = 16  # evaluated chunks kept in memory
+
+
+class ValueTable:
+    # Rows x, f(x) for x = start, start + step, ... up to stop. Nothing is
+    # stored up front: rows are computed a chunk at a time when asked for,
+    # and only a few recent chunks are kept.
+
+    def __init__(self, expression, start, stop, step, radians=True, engine=default_engine):
+        if not all(isfinite(value) for value in (start, stop, step)):
+            raise ValueError("start, stop and step must be finite")
+        if step == 0 or (stop - start) / step < 0:
+            raise ValueError("step must move from start towards stop")
+        if not isfinite((stop - start) / step):
+            raise ValueError("Too many rows")
+        self.expression = expression
+        self.start = start
+        self.step = step
+        self.radians = radians
+        self.engine = engine
+        self.engine.compile_function(expression)  # raises EvaluationError early
+        self.length = floor((stop - start) / step + 1e-9) + 1
+        self.chunks = OrderedDict()
+
+    def __len__(self):
+        return self.length
+
+    def x(self, row):
+        # Computed from the row number rather than by repeated addition, so
+        # row ten million is as accurate as row one.
+        return self.start + row * self.step
+
+    def chunk(self, index, cache=True):
+        ys = self.chunks.get(index) if cache else None
+        if ys is not None:
+            self.chunks.move_to_end(index)
+            return ys
+
+        first = index * CHUNK
+        xs = [self.x(row) for row in range(first, min(first + CHUNK, self.length))]
+        ys = as_floats(self.engine.evaluate_array(self.expression, {"x": xs}, self.radians))
+        if cache:
+            self.chunks[index] = ys
+            if len(self.chunks) > MAX_CHUNKS:
+                self.chunks.popitem(last=False)
+        return ys
+
+    def rows(self, first=0, count=None, cache=True):
+        # Generator of (x, y) rows; chunks are evaluated as iteration reaches them
+        stop = self.length if count is None else min(first + count, self.length)
+        row = first
+        while row < stop:
+            index, offset = divmod(row, CHUNK)
+            ys = self.chunk(index, cache)
+            for y in ys[offset:offset + stop - row]:
+                yield self.x(row), format_result(y)
+                row += 1
+
+    def export_csv(self, path, progress=None):
+        # Streams the rows without caching them, so memory stays at one chunk
+        # however long the table is and the viewer's cache is left alone.
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["x", self.expression])
+            for row, values in enumerate(self.rows(cache=False)):
+                writer.writerow(values)
+                if progress is not None and row % CHUNK == 0:
+                    progress(row)
+
+
+class TableWindow(tk.Toplevel):
+    def __init__(self, app, expression="x^2"):
+        super().__init__(app)
+        self.app = app
+        self.title("Table")
+        self.geometry("420x520")
+
+        self.table = None
+        self.exporter = None
+        self.top_row = 0
+        self.visible_rows = 20
+        self.fields = {}
+        self.status = tk.StringVar(value="")
+
+        form = app.register_widget("frame", tk.Frame(self))
+        form.pack(fill="x", padx=5, pady=5)
+        for column, (name, default) in enumerate([
+            ("f(x)", expression), ("start", "0"), ("stop", "10"), ("step", "1")
+        ]):
+            app.register_widget("display", tk.Label(form, text=name, font=app.history_font)).grid(
+                row=0, column=column, sticky="w"
+            )
+            variable = tk.StringVar(value=default)
+            entry = app.register_widget("history_input", tk.Entry(
+                form,
+                textvariable=variable,
+                font=app.history_font,
+                width=16 if column == 0 else 8,
+                relief="flat"
+            ))
+            entry.grid(row=1, column=column, sticky="ew", padx=2)
+            entry.bind("<Return>", lambda event: self.build_table())
+            self.fields[name] = variable
+        form.columnconfigure(0, weight=1)
+
+        buttons = app.register_widget("frame", tk.Frame(self))
+        buttons.pack(fill="x", padx=5)
+        for text, command in [("Show", self.build_table), ("Export CSV…", self.export)]:
+            app.register_widget("button", tk.Button(
+                buttons,
+                text=text,
+                font=app.history_font,
+                relief="flat",
+                command=command
+            )).pack(side="left", padx=2, pady=2)
+        app.register_widget("display", tk.Label(
+            buttons,
+            textvariable=self.status,
+            font=app.history_font
+        )).pack(side="right")
+
+        # Like the history panel, only the visible rows exist as text
+        self.text = app.register_widget("history", tk.Text(
+            self,
+            font=app.history_font,
+            state="disabled",
+            height=self.visible_rows,
+            wrap="none",
+            padx=5,
+            pady=5
+        ))
+        self.text.pack(fill="both", expand=True, padx=5, pady=5)
+        self.scrollbar = tk.Scrollbar(self.text, command=self.scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.text.bind("<MouseWheel>", lambda event: self.scroll("scroll", -1 if event.delta > 0 else 1, "units"))
+        self.text.bind("<Button-4>", lambda event: self.scroll("scroll", -1, "units"))
+        self.text.bind("<Button-5>", lambda event: self.scroll("scroll", 1, "units"))
+
+        self.build_table()
+
+    def build_table(self):
+        try:
+            self.table = ValueTable(
+                self.fields["f(x)"].get(),
+                float(self.fields["start"].get()),
+                float(self.fields["stop"].get()),
+                float(self.fields["step"].get()),
+                self.app.radians
+            )
+        except (EvaluationError, ValueError) as exc:
+            self.table = None
+            self.status.set(str(exc))
+            return
+        self.status.set(f"{len(self.table):,} rows")
+        self.top_row = 0
+        self.render()
+
+    def render(self):
+        rows = list(self.table.rows(self.top_row, self.visible_rows)) if self.table else []
+        self.text.config(state="normal")
+        self.text.delete(1.0, "end")
+        self.text.insert("end", "\n".join(f"{x:<20.10g} {y}" for x, y in rows))
+        self.text.config(state="disabled")
+
+        total = len(self.table) if self.table else 0
+        if total <= self.visible_rows:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.top_row / total, (self.top_row + self.visible_rows) / total)
+
+    def scroll(self, action, amount, unit=None):
+        if self.table is None:
+            return "break"
+        total = len(self.table)
+        if action == "moveto":
+            top = int(float(amount) * total)
+        else:
+            top = self.top_row + int(amount) * (self.visible_rows if unit == "pages" else 1)
+        top = max(0, min(top, total - self.visible_rows))
+        if top != self.top_row:
+            self.top_row = top
+            self.render()
+        return "break"
+
+    def export(self):
+        from tkinter import filedialog
+        if self.table is None or self.exporter is not None:
+            return
+        path = filedialog.asksaveasfilename(
+            parent=self,
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv")]
+        )
+        if not path:
+            return
+
+        # Written from a thread; progress is picked up by polling with after()
+        table = self.table
+        state = {"row": 0, "error": None}
+
+        def run():
+            try:
+                table.export_csv(path, progress=lambda row: state.update(row=row))
+            except Exception as exc:  # any failure, so poll_export never reports a partial file as done
+                state["error"] = exc
+
+        self.exporter = threading.Thread(target=run, daemon=True)
+        self.exporter.start()
+        self.after(100, self.poll_export, table, state)
+
+    def poll_export(self, table, state):
+        if self.exporter.is_alive():
+            self.status.set(f"Exporting… {state['row']:,} of {len(table):,}")
+            self.after(100, self.poll_export, table, state)
+            return
+        self.exporter = None
+        if state["error"] is not None:
+            from tkinter import messagebox
+            messagebox.showerror("Export CSV", str(state["error"]), parent=self)
+            self.status.set("")
+        else:
+            self.status.set(f"Exported {len(table):,} rows")